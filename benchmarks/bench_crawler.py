@@ -0,0 +1,103 @@
+import argparse, asyncio, json, tempfile
+from pathlib import Path
+from time import perf_counter
+import seek_crawler
+from seek_crawler import headers, crawl_pages, crawl_pages_async, extract_info_from_json, create_df, merge_history, write_df_to_xlsx
+from benchmarks.fixtures import PAGE_SIZE, synthesize_jobs
+from benchmarks.stub_server import start_stub_server
+
+'''
+    Offline throughput benchmarks for the Seeker pipeline, nothing here talks to seek.com.au
+
+        python -m benchmarks.bench_crawler --pages 1 5 20 --history 0 1000 10000 --latency 0.05 --error-rate 0.02
+
+    Reports pages/sec for the fetch stage (both engines, against the local stub server), records/sec for
+    extract_info_from_json, and seconds for the history merge in main() and for write_df_to_xlsx
+'''
+
+
+def timed(func,*args,**kwargs):
+    start=perf_counter()
+    result=func(*args,**kwargs)
+    return perf_counter()-start,result
+
+
+def bench_fetch(server,pages,workers,engine):
+    if engine=='async':
+        elapsed,outputs=timed(asyncio.run,crawl_pages_async('','','',server.url,headers,pages,concurrency=workers))
+    else:
+        elapsed,outputs=timed(crawl_pages,'','','',server.url,headers,pages,max_workers=workers)
+    return {'stage':f'fetch ({engine})','pages':pages,'records':len(outputs),'seconds':elapsed,'pages_per_sec':pages/elapsed}
+
+
+def bench_extract(count):
+    jobs=synthesize_jobs(count)
+    elapsed,outputs=timed(extract_info_from_json,jobs)
+    return {'stage':'extract','records':len(outputs),'seconds':elapsed,'records_per_sec':len(outputs)/elapsed}
+
+
+def bench_merge(history_size,new_rows,expiry=21):
+    # half of the new rows overlap the history so dedupe has work to do
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fullname=Path(tmp_dir) / 'history.xlsx'
+        if history_size:
+            write_df_to_xlsx(create_df(extract_info_from_json(synthesize_jobs(history_size,start=new_rows//2))),fullname)
+        df=create_df(extract_info_from_json(synthesize_jobs(new_rows))).sort_values(by='time_posted',ascending=False)
+
+        # time read + dedupe + expiry only, the write is measured on its own below
+        writer=seek_crawler.WRITERS['xlsx']
+        seek_crawler.WRITERS['xlsx']=lambda df,fullname:None
+        try:
+            merge_seconds,merged=timed(merge_history,df,fullname,expiry)
+        finally:
+            seek_crawler.WRITERS['xlsx']=writer
+        write_seconds,_=timed(write_df_to_xlsx,merged,Path(tmp_dir) / 'merged.xlsx')
+    return [
+        {'stage':'merge','history_rows':history_size,'new_rows':new_rows,'rows_after':len(merged),'seconds':merge_seconds},
+        {'stage':'write_xlsx','rows':len(merged),'seconds':write_seconds},
+    ]
+
+
+def format_row(row):
+    return '  '.join(f'{k}={v:.3f}' if isinstance(v,float) else f'{k}={v}' for k,v in row.items())
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Offline Seeker benchmarks against a local stub server')
+    parser.add_argument('--pages',type=int,nargs='+',default=[1,5,20],help='page counts for the fetch stage')
+    parser.add_argument('--history',type=int,nargs='+',default=[0,1000,10000],help='history sizes for merge/write')
+    parser.add_argument('--workers',type=int,default=seek_crawler.MAX_WORKERS)
+    parser.add_argument('--engines',nargs='+',choices=seek_crawler.ENGINES,default=list(seek_crawler.ENGINES))
+    parser.add_argument('--latency',type=float,default=0.05,help='stub server latency in seconds')
+    parser.add_argument('--jitter',type=float,default=0.0)
+    parser.add_argument('--error-rate',type=float,default=0.0,help='share of stub responses that are 503')
+    parser.add_argument('--json',type=Path,help='also write the results to this file')
+    args=parser.parse_args(argv)
+
+    results=[]
+    server=start_stub_server(total_pages=max(args.pages),latency=args.latency,jitter=args.jitter,error_rate=args.error_rate)
+    try:
+        for engine in args.engines:
+            for pages in args.pages:
+                results.append(bench_fetch(server,pages,args.workers,engine))
+                print(format_row(results[-1]))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for pages in args.pages:
+        results.append(bench_extract(pages*PAGE_SIZE))
+        print(format_row(results[-1]))
+
+    for history_size in args.history:
+        for row in bench_merge(history_size,max(args.pages)*PAGE_SIZE):
+            results.append(row)
+            print(format_row(row))
+
+    if args.json:
+        with open(args.json,'w') as wf:
+            json.dump(results,wf,indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse, tempfile
+from pathlib import Path
+import pandas as pd
+from seek_crawler import OUTPUT_FORMATS, EXTENSIONS, WRITERS, READERS, UNKNOWN_CONTRACT_TYPE, create_df, extract_info_from_json
+from benchmarks.fixtures import synthesize_jobs
+
+'''
+    Round trip check for the history writers and readers, nothing here talks to seek.com.au
+
+        python -m benchmarks.check_formats [--formats xlsx csv parquet] [--rows 100]
+
+    Writes a history where some rows have no contract type and no time posted, i.e. what an older history
+    holds, reads it back, writes what was read again like a merge does and checks no row was lost on the way
+'''
+
+
+def history_with_null_keys(rows):
+    df=create_df(extract_info_from_json(synthesize_jobs(rows)))
+    # every third row loses its contract type, every fifth its listing date
+    df['contract_type']=df['contract_type'].astype(object).where(df.index % 3 != 0,None)
+    df['time_posted']=df['time_posted'].where(df.index % 5 != 0,pd.NaT)
+    return df
+
+
+def unknown_contract_types(df):
+    contract_types=df['contract_type'].astype(object)
+    return int((contract_types.isna() | (contract_types==UNKNOWN_CONTRACT_TYPE)).sum())
+
+
+def check_format(output_format,rows):
+    df=history_with_null_keys(rows)
+    expected=set(df['job_id'].astype(str))
+    undated=int(df['time_posted'].isna().sum())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fullname=Path(tmp_dir) / f'history{EXTENSIONS[output_format]}'
+        WRITERS[output_format](df.copy(),fullname)
+        df_read=READERS[output_format](fullname)
+        # second pass is the rewrite every merge does
+        WRITERS[output_format](df_read.copy(),fullname)
+        df_read=READERS[output_format](fullname)
+
+    job_ids=set(df_read['job_id'].astype(str))
+    assert job_ids==expected, f'{output_format}: {len(expected-job_ids)} rows lost, {len(job_ids-expected)} rows added'
+    assert int(df_read['time_posted'].isna().sum())==undated, f'{output_format}: undated rows changed'
+    # a missing contract type may come back as the placeholder but never as another type
+    assert unknown_contract_types(df_read)==unknown_contract_types(df), f'{output_format}: contract types changed'
+    return {'format':output_format,'rows':len(df_read),'undated':undated}
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Round trip the history formats with null partition keys')
+    parser.add_argument('--formats',nargs='+',choices=OUTPUT_FORMATS,default=list(OUTPUT_FORMATS))
+    parser.add_argument('--rows',type=int,default=100)
+    args=parser.parse_args(argv)
+
+    for output_format in args.formats:
+        result=check_format(output_format,args.rows)
+        print('  '.join(f'{k}={v}' for k,v in result.items())+'  ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse, json
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+'''
+    Recorded chalice-search pages for the offline benchmarks
+
+    fixtures/page_<n>.json are real responses saved by the record command, pages that were not recorded are
+    synthesized from the jobs in fixtures/sample_page.json so any page count can be served. Record with:
+
+        python -m benchmarks.fixtures record --keyword "python developer" --location brisbane --pages 3
+'''
+
+
+FIXTURE_DIR=Path(__file__).resolve().parent / 'fixtures'
+PAGE_SIZE=22
+
+
+def load_templates(fixture_dir=FIXTURE_DIR):
+    # job jsons to clone from, recorded pages first then the hand written sample
+    templates=[]
+    for path in sorted(fixture_dir.glob('page_*.json'))+[fixture_dir / 'sample_page.json']:
+        with open(path,'r') as rf:
+            templates.extend(json.load(rf).get('data') or [])
+    return templates
+
+
+def synthesize_jobs(count,start=0,templates=None,now=None):
+    # unique ids and listing dates going back one minute per job, i.e. sorted newest first like the api
+    templates=templates or load_templates()
+    now=now or datetime.now(timezone.utc)
+    jobs=[]
+    for i in range(start,start+count):
+        job=dict(templates[i % len(templates)])
+        job['id']=str(90000000+i)
+        job['isPremium']=False
+        job['listingDate']=(now-timedelta(minutes=i)).strftime(r'%Y-%m-%dT%H:%M:%SZ')
+        jobs.append(job)
+    return jobs
+
+
+class FixturePages:
+    # serves recorded pages as they are and synthesizes the rest up to total_pages
+    def __init__(self,total_pages=20,page_size=PAGE_SIZE,fixture_dir=FIXTURE_DIR):
+        self.total_pages=total_pages
+        self.page_size=page_size
+        self.recorded={}
+        for path in fixture_dir.glob('page_*.json'):
+            with open(path,'r') as rf:
+                self.recorded[int(path.stem.split('_')[1])]=json.load(rf)
+        self.templates=load_templates(fixture_dir)
+        self.now=datetime.now(timezone.utc)
+
+    def page(self,pageNum):
+        if pageNum in self.recorded:
+            return self.recorded[pageNum]
+        if pageNum > self.total_pages:
+            jobs=[]
+        else:
+            jobs=synthesize_jobs(self.page_size,(pageNum-1)*self.page_size,self.templates,self.now)
+        return {'totalCount':self.total_pages*self.page_size,'data':jobs}
+
+
+def record(keyword,classification,location,pages,fixture_dir=FIXTURE_DIR):
+    # talks to the live api, only run this to refresh the fixtures
+    from seek_crawler import API_URL, headers, create_session, fetch_search_page
+    fixture_dir.mkdir(parents=True,exist_ok=True)
+    with create_session(pool_size=1,headers=headers) as session:
+        for pageNum in range(1,pages+1):
+            json_combo=fetch_search_page(keyword,classification,location,API_URL,headers,pageNum,session)
+            if not json_combo or not json_combo.get('data'):
+                break
+            with open(fixture_dir / f'page_{pageNum}.json','w') as wf:
+                json.dump(json_combo,wf,indent=2)
+            print(f'Recorded page {pageNum} with {len(json_combo["data"])} jobs')
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Manage recorded chalice-search fixtures')
+    subparsers=parser.add_subparsers(dest='command',required=True)
+    record_parser=subparsers.add_parser('record',help='record live search pages into the fixture dir')
+    record_parser.add_argument('--keyword',default='')
+    record_parser.add_argument('--classification',default='')
+    record_parser.add_argument('--location',default='')
+    record_parser.add_argument('--pages',type=int,default=3)
+    args=parser.parse_args()
+    record(args.keyword,args.classification,args.location,args.pages)
@@ -0,0 +1,97 @@
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from benchmarks.fixtures import FixturePages
+
+'''
+    Local stand-in for the chalice-search endpoint
+
+    Replays fixture pages with a configurable latency and error rate, keep-alive is supported so the pooled
+    session behaves as it does against the real site. Run standalone with:
+
+        python -m benchmarks.stub_server --port 8765 --pages 20 --latency 0.05 --error-rate 0.02
+'''
+
+
+SEARCH_PATH='/api/chalice-search/v4/search'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1'
+
+    def do_GET(self):
+        server=self.server
+        url=urlsplit(self.path)
+        if url.path!=SEARCH_PATH:
+            self.send_json(404,{'error':'not found'})
+            return
+
+        time.sleep(server.latency+random.uniform(0,server.jitter))
+        with server.lock:
+            server.requests+=1
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.errors+=1
+            self.send_json(503,{'error':'stub outage'},{'Retry-After':'0'})
+            return
+
+        pageNum=int(parse_qs(url.query).get('page',['1'])[0])
+        self.send_json(200,server.pages.page(pageNum))
+
+    def send_json(self,status,payload,extra_headers=None):
+        body=json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        for k,v in (extra_headers or {}).items():
+            self.send_header(k,v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self,format,*args):
+        # keep benchmark output readable
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads=True
+
+    def __init__(self,address,total_pages=20,latency=0.0,jitter=0.0,error_rate=0.0):
+        super().__init__(address,StubHandler)
+        self.pages=FixturePages(total_pages=total_pages)
+        self.latency=latency
+        self.jitter=jitter
+        self.error_rate=error_rate
+        self.lock=threading.Lock()
+        self.requests=0
+        self.errors=0
+
+    @property
+    def url(self):
+        host,port=self.server_address[:2]
+        return f'http://{host}:{port}{SEARCH_PATH}'
+
+
+def start_stub_server(total_pages=20,latency=0.0,jitter=0.0,error_rate=0.0,host='127.0.0.1',port=0):
+    # port 0 picks a free port, read it back from server.url; call server.shutdown() when done
+    server=StubServer((host,port),total_pages,latency,jitter,error_rate)
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Serve fixture chalice-search pages locally')
+    parser.add_argument('--host',default='127.0.0.1')
+    parser.add_argument('--port',type=int,default=8765)
+    parser.add_argument('--pages',type=int,default=20,help='pages the stub reports as available')
+    parser.add_argument('--latency',type=float,default=0.0,help='seconds added to every response')
+    parser.add_argument('--jitter',type=float,default=0.0,help='extra random latency up to this many seconds')
+    parser.add_argument('--error-rate',type=float,default=0.0,help='share of requests answered with 503')
+    args=parser.parse_args()
+
+    server=StubServer((args.host,args.port),args.pages,args.latency,args.jitter,args.error_rate)
+    print(f'Serving fixture pages at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,176 @@
+import argparse, json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from seek_crawler import (API_URL, BASE_DIR, MAX_WORKERS, RATE_LIMIT, OUTPUT_FORMATS, EXTENSIONS, headers, classifications,
+                          ResponseCache, RunMetrics, RateController, export_metrics, timed_stage, create_session, fetch_search_page, plan_last_page, crawl_remaining_pages, iter_info_from_json,
+                          file_name_formatter, save_results, enrich_records, JobIndex, INDEX_PATH, Rollups, ROLLUP_PATH)
+
+'''
+    This file contains the headless batch runner for Seeker
+
+    All queries in a spec file share one worker pool and one connection pool, jobs returned by several
+    queries are extracted once. Usage:
+
+        python seek_batch.py queries.json --workers 16 [--combined all_jobs] [--format parquet] [--store]
+
+    The spec file is a data/args.json style object, a list of them, or {"defaults": {...}, "queries": [...]}
+'''
+
+
+# query spec keys follow data/args.json
+SPEC_DEFAULTS = {'kw': '', 'classification': '', 'location': '', 'pageNum': 1, 'expiry': 14, 'save_path': ''}
+
+
+def load_specs(path):
+    with open(path,'r') as rf:
+        data=json.load(rf)
+    if isinstance(data,dict) and 'queries' in data:
+        defaults,queries=data.get('defaults',{}),data['queries']
+    elif isinstance(data,dict):
+        defaults,queries={},[data]
+    else:
+        defaults,queries={},data
+
+    specs=[]
+    for query in queries:
+        spec={**SPEC_DEFAULTS,**defaults,**query}
+        if spec['classification'] not in classifications:
+            raise ValueError(f"Unknown classification {spec['classification']!r} in query {query}")
+        spec['save_path']=Path(spec['save_path'] or BASE_DIR)
+        specs.append(spec)
+    return specs
+
+
+def crawl_queries(specs,BASE_URL,headers,max_workers=MAX_WORKERS,session=None,cache=None,metrics=None,controller=None):
+    # raw job jsons per query, every page of every query goes through the same pool
+    own_session=session is None
+    session=session or create_session(pool_size=max_workers,headers=headers)
+
+    def fetch(spec,pageNum):
+        return fetch_search_page(spec['kw'],spec['classification'],spec['location'],BASE_URL,headers,pageNum,session,cache,metrics,controller)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # first page of every query in flight at once, their total counts size the rest
+            first_pages=[future.result() for future in [executor.submit(fetch,spec,1) for spec in specs]]
+            last_pages=[plan_last_page(first_page,spec['pageNum']) for spec,first_page in zip(specs,first_pages)]
+            # every query is a shard of the same page loop the threaded and sharded crawls use
+            query_pages=crawl_remaining_pages(fetch,specs,first_pages,last_pages,executor)
+            # None marks a query whose first page failed after every retry, i.e. a fetch error and not an empty search
+            results=[None if first_page is None else [job for jobs in pages for job in jobs] for first_page,pages in zip(first_pages,query_pages)]
+    finally:
+        if own_session:
+            session.close()
+    return results
+
+
+def dedupe_and_extract(raw_results,metrics=None):
+    # returns {job_id: record} plus the job ids of each query, each job id is extracted only once
+    unique_jobs={}
+    query_ids=[]
+    for jobs in raw_results:
+        jobs=jobs or []
+        ids=[str(job.get('id')) for job in jobs]
+        for job_id,job in zip(ids,jobs):
+            unique_jobs.setdefault(job_id,job)
+        query_ids.append([*dict.fromkeys(ids)])
+    with timed_stage(metrics,'extract'):
+        records=dict(zip(unique_jobs,iter_info_from_json(unique_jobs.values())))
+    if metrics is not None:
+        metrics.add_rows('scraped',sum(len(jobs or []) for jobs in raw_results))
+        metrics.add_rows('unique',len(records))
+    return records,query_ids
+
+
+def run_batch(specs,BASE_URL=API_URL,headers=headers,max_workers=MAX_WORKERS,combined=None,store=False,export=None,streaming=False,output_format='xlsx',cache_ttl=None,rate_limit=RATE_LIMIT,index=True,rollups=True,enrich=False,metrics_json=None,metrics_textfile=None):
+    cache=ResponseCache(ttl=cache_ttl) if cache_ttl else None
+    # one controller for the whole batch so every query backs off together when the site pushes back
+    controller=RateController(rate=rate_limit,max_limit=max_workers) if rate_limit else None
+    # one metrics object for the whole batch, stage times and row counts add up over the queries
+    metrics=RunMetrics(labels={'query':combined or 'batch'}) if metrics_json or metrics_textfile else None
+    # the batch extracts after the dedupe, so here fetch and extract don't overlap
+    with timed_stage(metrics,'fetch'):
+        raw_results=crawl_queries(specs,BASE_URL,headers,max_workers,cache=cache,metrics=metrics,controller=controller)
+    records,query_ids=dedupe_and_extract(raw_results,metrics)
+    if enrich and records:
+        # after the dedupe so a job shared by several queries is looked up once
+        with timed_stage(metrics,'enrich'):
+            enrich_records(records.values(),metrics=metrics,controller=controller)
+    elif records:
+        # descriptions of earlier enriched runs are kept, nothing is fetched
+        enrich_records(records.values(),fetch=False)
+    messages=[]
+    failed=[jobs is None for jobs in raw_results]
+    for spec,query_failed in zip(specs,failed):
+        if query_failed:
+            fname=file_name_formatter(spec['kw'],spec['classification'],spec['location'],ext=EXTENSIONS[output_format])
+            messages.append(f'{fname}: page 1 could not be retrieved, nothing was saved for this search.')
+
+    if combined:
+        # one output for everything, kept as long as the longest expiry asks for
+        fullname=specs[0]['save_path'] / f"{combined}{EXTENSIONS[output_format]}"
+        if records:
+            total,_=save_results(list(records.values()),fullname,max(spec['expiry'] for spec in specs),store,export,streaming,output_format,metrics)
+            messages.append(f'{fullname.name}: a total of {total} jobs have been scraped.')
+    else:
+        for spec,ids,query_failed in zip(specs,query_ids,failed):
+            if query_failed:
+                continue
+            fname=file_name_formatter(spec['kw'],spec['classification'],spec['location'],ext=EXTENSIONS[output_format])
+            if not ids:
+                messages.append(f'{fname}: no jobs found for this search.')
+                continue
+            total,_=save_results([records[job_id] for job_id in ids],spec['save_path'] / fname,spec['expiry'],store,export,streaming,output_format,metrics)
+            messages.append(f'{fname}: a total of {total} jobs have been scraped.')
+
+    if index and records:
+        # every unique job of the batch goes into the full text index once
+        with timed_stage(metrics,'index'),JobIndex(INDEX_PATH) as job_index:
+            job_index.add(records.values())
+    if rollups:
+        # rollups are kept per query, with --combined the whole batch counts as one
+        with timed_stage(metrics,'rollups'),Rollups(ROLLUP_PATH) as daily_rollups:
+            # a query that could not be fetched records nothing, not a day without postings
+            if combined and not all(failed):
+                daily_rollups.update(combined,records.values(),max(spec['expiry'] for spec in specs))
+            elif not combined:
+                for spec,ids,query_failed in zip(specs,query_ids,failed):
+                    if query_failed:
+                        continue
+                    name=file_name_formatter(spec['kw'],spec['classification'],spec['location'],ext='')
+                    daily_rollups.update(name,[records[job_id] for job_id in ids],spec['expiry'])
+
+    if cache:
+        messages.append(cache.report())
+    if controller:
+        messages.append(controller.report())
+    if metrics is not None:
+        export_metrics(metrics,metrics_json,metrics_textfile)
+    return messages
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Run many seek queries through one shared worker and connection pool')
+    parser.add_argument('specs',type=Path,help='query spec file, data/args.json style')
+    parser.add_argument('--workers',type=int,default=MAX_WORKERS,help='worker threads and pooled connections')
+    parser.add_argument('--combined',metavar='NAME',help='write one combined output called NAME instead of one per query')
+    parser.add_argument('--format',dest='output_format',choices=OUTPUT_FORMATS,default='xlsx')
+    parser.add_argument('--store',action='store_true',help='keep the history in a sqlite store next to each output')
+    parser.add_argument('--export',action=argparse.BooleanOptionalAction,help='rewrite the output file, on by default unless --store is given')
+    parser.add_argument('--streaming',action='store_true',help='constant memory xlsx merge')
+    parser.add_argument('--cache-ttl',type=int,metavar='SECONDS',help='serve search pages fetched within SECONDS from the on disk cache')
+    parser.add_argument('--enrich',action='store_true',help='add the full ad text of jobs not fetched before as a description column')
+    parser.add_argument('--no-rollups',dest='rollups',action='store_false',help='skip updating the daily rollups')
+    parser.add_argument('--no-index',dest='index',action='store_false',help='skip adding the jobs to the full text index')
+    parser.add_argument('--rate-limit',type=float,default=RATE_LIMIT,metavar='RPS',help='most requests per second the adaptive controller ramps up to, 0 turns pacing off')
+    parser.add_argument('--metrics-json',type=Path,help='write a json run summary here')
+    parser.add_argument('--metrics-textfile',type=Path,help='write prometheus metrics here for the node exporter textfile collector')
+    args=parser.parse_args(argv)
+
+    specs=load_specs(args.specs)
+    for message in run_batch(specs,max_workers=args.workers,combined=args.combined,store=args.store,export=args.export,streaming=args.streaming,output_format=args.output_format,cache_ttl=args.cache_ttl,rate_limit=args.rate_limit,index=args.index,rollups=args.rollups,enrich=args.enrich,metrics_json=args.metrics_json,metrics_textfile=args.metrics_textfile):
+        print(message)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import json, time, logging
+from pathlib import Path
+
+'''
+    This file contains the lightweight settings shared by the Seeker window and crawler
+
+    Nothing heavy is imported here so the window can open before pandas/requests are loaded,
+    the classification table is cached in data/classifications.json and refreshed from seek.com.au once stale
+'''
+
+
+logger=logging.getLogger(__name__)
+
+BASE_DIR=Path(__file__).resolve().parent
+
+API_URL = r'https://www.seek.com.au/api/chalice-search/v4/search'
+# job ad page, also the url column of every output
+JOB_URL = r'https://www.seek.com.au/job/{}'
+headers = {
+    'accept': '*/*',
+    'accept-language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
+    'content-type': 'application/json',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36',
+}
+
+ENGINES=('threads','async')
+OUTPUT_FORMATS=('xlsx','csv','parquet')
+
+# shipped table, used until the first refresh lands in the cache
+DEFAULT_CLASSIFICATIONS = {'':'', 'Accounting': '1200', 'Administration & Office Support': '6251',
+                 'Advertising, Arts & Media': '6304', 'Banking & Financial Services': '1203',
+                 'Call Centre & Customer Service': '1204', 'CEO & General Management': '7019',
+                 'Community Services & Development': '6163', 'Construction': '1206',
+                 'Consulting & Strategy': '6076', 'Design & Architecture': '6263',
+                 'Education & Training': '6123', 'Engineering': '1209',
+                 'Farming, Animals & Conservation': '6205', 'Government & Defence': '1210',
+                 'Healthcare & Medical': '1211', 'Hospitality & Tourism': '1212',
+                 'Human Resources & Recruitment': '6317', 'Information & Communication Technology': '6281',
+                 'Insurance & Superannuation': '1214', 'Legal': '1216', 'Manufacturing, Transport & Logistics': '6092',
+                 'Marketing & Communications': '6008', 'Mining, Resources & Energy': '6058',
+                 'Real Estate & Property': '1220', 'Retail & Consumer Products': '6043', 'Sales': '6362',
+                 'Science & Technology': '1223', 'Self Employment': '6261', 'Sport & Recreation': '6246',
+                 'Trades & Services': '1225'}
+
+CLASSIFICATION_CACHE=BASE_DIR / 'data/classifications.json'
+CLASSIFICATION_TTL=7*24*3600
+
+
+def read_classification_cache(path=CLASSIFICATION_CACHE):
+    # returns (table, fetched_at) or (None, 0) when there is no usable cache
+    try:
+        with open(path,'r') as rf:
+            cached=json.load(rf)
+        return cached['classifications'],cached['fetched_at']
+    except (FileNotFoundError,json.JSONDecodeError,KeyError):
+        return None,0
+
+
+def load_classifications(path=CLASSIFICATION_CACHE):
+    table,_=read_classification_cache(path)
+    return {'':'',**table} if table else dict(DEFAULT_CLASSIFICATIONS)
+
+
+def classifications_stale(path=CLASSIFICATION_CACHE,ttl=CLASSIFICATION_TTL):
+    _,fetched_at=read_classification_cache(path)
+    return time.time()-fetched_at > ttl
+
+
+def refresh_classifications(path=CLASSIFICATION_CACHE):
+    # scrapes the live table and updates the shared dict in place, so modules holding it see the new ids
+    from seek_crawler import update_classification_list
+    fetched=update_classification_list()
+    # only trust a scrape that still looks like name -> numeric id
+    fetched={name.strip():str(cid) for name,cid in fetched.items() if name.strip() and str(cid).isdigit()}
+    if not fetched:
+        logger.warning('Classification refresh returned nothing usable, keeping the current table')
+        return classifications
+    with open(path,'w') as wf:
+        json.dump({'fetched_at':time.time(),'classifications':fetched},wf,indent=4)
+    # update before dropping names so a crawl running meanwhile never sees an empty table
+    table={'':'',**fetched}
+    classifications.update(table)
+    for name in [name for name in classifications if name not in table]:
+        classifications.pop(name,None)
+    return classifications
+
+
+classifications=load_classifications()
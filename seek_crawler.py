@@ -1,9 +1,33 @@
-import requests, logging
-from bs4 import BeautifulSoup
+import requests, logging, random, time, asyncio, math, json, os, heapq, shutil, hashlib, threading, sqlite3, importlib.util
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from itertools import islice
 import pandas as pd
 from concurrent.futures import ThreadPoolExecutor
+from seek_store import JobStore, JOB_COLUMNS, apply_job_schema
+from seek_index import JobIndex, INDEX_PATH
+from seek_rollups import Rollups, ROLLUP_PATH
+from seek_config import BASE_DIR, API_URL, JOB_URL, headers, classifications, ENGINES, OUTPUT_FORMATS
+
+# aiohttp is optional, the asyncio engine falls back to the pooled requests session without it
+try:
+    import aiohttp
+except ImportError:
+    aiohttp=None
+
+# orjson is optional too, it decodes search pages several times faster than the stdlib
+try:
+    import orjson
+    json_loads=orjson.loads
+except ImportError:
+    orjson=None
+    json_loads=json.loads
 
 '''
     Ranco Xu @2024-02-16 at my Brissy home with my beagle girl Coco
@@ -25,35 +49,559 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
-API_URL = r'https://www.seek.com.au/api/chalice-search/v4/search'
-headers = {
-    'accept': '*/*',
-    'accept-language': 'en-US,en;q=0.9,zh-CN;q=0.8,zh;q=0.7',
-    'content-type': 'application/json',
-    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36',
-}
-
-classifications = {'':'', 'Accounting': '1200', 'Administration & Office Support': '6251', 
-                 'Advertising, Arts & Media': '6304', 'Banking & Financial Services': '1203', 
-                 'Call Centre & Customer Service': '1204', 'CEO & General Management': '7019', 
-                 'Community Services & Development': '6163', 'Construction': '1206', 
-                 'Consulting & Strategy': '6076', 'Design & Architecture': '6263', 
-                 'Education & Training': '6123', 'Engineering': '1209', 
-                 'Farming, Animals & Conservation': '6205', 'Government & Defence': '1210', 
-                 'Healthcare & Medical': '1211', 'Hospitality & Tourism': '1212', 
-                 'Human Resources & Recruitment': '6317', 'Information & Communication Technology': '6281', 
-                 'Insurance & Superannuation': '1214', 'Legal': '1216', 'Manufacturing, Transport & Logistics': '6092', 
-                 'Marketing & Communications': '6008', 'Mining, Resources & Energy': '6058', 
-                 'Real Estate & Property': '1220', 'Retail & Consumer Products': '6043', 'Sales': '6362', 
-                 'Science & Technology': '1223', 'Self Employment': '6261', 'Sport & Recreation': '6246', 
-                 'Trades & Services': '1225'}
-
-BASE_DIR=Path(__file__).resolve().parent
+# http session set up
+MAX_WORKERS=8
+REQUEST_TIMEOUT=(5,20)  # (connect, read) in seconds
+MAX_RETRIES=3
+BACKOFF_FACTOR=0.5
+BACKOFF_MAX=30
+RETRY_STATUS={429,500,502,503,504}
+
+# adaptive pacing, the token bucket starts at and never exceeds RATE_LIMIT requests/sec
+RATE_LIMIT=10
+RATE_BURST=5
+MIN_RATE=0.5
+# multiplicative decrease on 429/5xx, timeouts and latency spikes, at most once per cooldown
+AIMD_DECREASE=0.5
+AIMD_COOLDOWN=1.0
+LATENCY_SPIKE=3.0  # times the smoothed latency of healthy responses
+LATENCY_SPIKE_MIN=1.0  # seconds, a response faster than this is never a spike whatever the jitter
+ADMIT_POLL=0.05
+# refused connections and dns failures are not congestion, this many in a row fail every request fast instead
+CIRCUIT_BREAKER=5
+CIRCUIT_RESET=60  # seconds before one request is let through to try again
+
+# sortmode value that orders results newest first, the incremental crawl relies on it
+LISTED_DATE_SORT='ListedDate'
+# the search api stops serving results past this page, broader queries are sharded to get everything
+API_PAGE_CEILING=25
+# workType facet ids, every job has exactly one so the slices never overlap
+WORK_TYPES={'Full time':'242','Part time':'243','Contract/Temp':'244','Casual/Vacation':'245'}
+
+# opt-in job ad enrichment, descriptions are cached for good once fetched
+DETAIL_CACHE=BASE_DIR / 'data/job_details.db'
+DETAIL_WORKERS=4
+
+# per query "since last run" state, keyed by output file
+WATERMARK_FILE=BASE_DIR / 'data/watermarks.json'
+
+# opt-in on disk cache of search pages
+CACHE_DIR=BASE_DIR / 'data/cache'
+CACHE_TTL=600
+CACHE_MAX_BYTES=50*1024**2
+
+# request latency histogram buckets in seconds, +Inf is implied
+LATENCY_BUCKETS=(0.05,0.1,0.25,0.5,1,2.5,5,10)
+
+
+# =================== Run Metrics =====================
+class RunMetrics:
+    # thread safe counters for one run, exported as a json summary and/or a prometheus textfile
+    def __init__(self,labels=None):
+        self.labels=labels or {}
+        self.lock=threading.Lock()
+        self.started=time.time()
+        self.latency_buckets=[0]*len(LATENCY_BUCKETS)
+        self.latency_sum=0.0
+        self.requests=0
+        self.status_codes=Counter()
+        self.bytes=0
+        self.retries=0
+        self.stages=Counter()
+        self.rows={}
+
+    def observe_request(self,latency,status,nbytes=0):
+        # status is the http status code or 'error' when no response came back
+        with self.lock:
+            self.requests+=1
+            self.latency_sum+=latency
+            for i,bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    self.latency_buckets[i]+=1
+            self.status_codes[str(status)]+=1
+            self.bytes+=nbytes
+
+    def observe_retry(self):
+        with self.lock:
+            self.retries+=1
+
+    @contextmanager
+    def stage(self,name):
+        # stages timed from several worker threads add up, e.g. extract is summed over workers.
+        # stages may nest and overlap: the threads and async crawls extract each page as it arrives,
+        # so fetch is wall time that includes that extract time, extract is the cpu share of it
+        start=time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.stages[name]+=time.perf_counter()-start
+
+    def add_rows(self,name,count):
+        # summed so a batch of queries reports totals
+        with self.lock:
+            self.rows[name]=self.rows.get(name,0)+int(count)
+
+    def summary(self):
+        with self.lock:
+            return {
+                'labels':self.labels,
+                'started':datetime.fromtimestamp(self.started,timezone.utc).isoformat(),
+                'duration_seconds':time.time()-self.started,
+                'requests':{
+                    'total':self.requests,
+                    'status_codes':dict(self.status_codes),
+                    'bytes':self.bytes,
+                    'retries':self.retries,
+                    'latency_seconds':{
+                        'sum':self.latency_sum,
+                        'mean':self.latency_sum/self.requests if self.requests else None,
+                        'buckets':{str(bound):count for bound,count in zip(LATENCY_BUCKETS,self.latency_buckets)},
+                    },
+                },
+                'stages_seconds':dict(self.stages),
+                'rows':dict(self.rows),
+            }
+
+    def write_json(self,path):
+        with open(path,'w') as wf:
+            json.dump(self.summary(),wf,indent=2)
+
+    def prometheus_lines(self):
+        summary=self.summary()
+        def labels(**extra):
+            pairs={**self.labels,**extra}
+            if not pairs:
+                return ''
+            escaped={k:str(v).replace('\\','\\\\').replace('"','\\"') for k,v in pairs.items()}
+            return '{'+','.join(f'{k}="{v}"' for k,v in escaped.items())+'}'
+
+        requests_=summary['requests']
+        lines=[
+            '# HELP seeker_request_duration_seconds Latency of requests to seek.',
+            '# TYPE seeker_request_duration_seconds histogram',
+        ]
+        for bound,count in requests_['latency_seconds']['buckets'].items():
+            lines.append(f'seeker_request_duration_seconds_bucket{labels(le=bound)} {count}')
+        lines+=[
+            f'seeker_request_duration_seconds_bucket{labels(le="+Inf")} {requests_["total"]}',
+            f'seeker_request_duration_seconds_sum{labels()} {requests_["latency_seconds"]["sum"]}',
+            f'seeker_request_duration_seconds_count{labels()} {requests_["total"]}',
+            '# HELP seeker_requests_total Requests to seek by status code.',
+            '# TYPE seeker_requests_total counter',
+        ]
+        lines+=[f'seeker_requests_total{labels(status=status)} {count}' for status,count in requests_['status_codes'].items()]
+        lines+=[
+            '# HELP seeker_response_bytes_total Response body bytes received.',
+            '# TYPE seeker_response_bytes_total counter',
+            f'seeker_response_bytes_total{labels()} {requests_["bytes"]}',
+            '# HELP seeker_request_retries_total Requests retried after an error.',
+            '# TYPE seeker_request_retries_total counter',
+            f'seeker_request_retries_total{labels()} {requests_["retries"]}',
+            '# HELP seeker_stage_duration_seconds Time spent per pipeline stage in the last run, stages overlap (fetch includes per page extract).',
+            '# TYPE seeker_stage_duration_seconds gauge',
+        ]
+        lines+=[f'seeker_stage_duration_seconds{labels(stage=stage)} {seconds}' for stage,seconds in summary['stages_seconds'].items()]
+        lines+=[
+            '# HELP seeker_rows Row counts at each step of the last run.',
+            '# TYPE seeker_rows gauge',
+        ]
+        lines+=[f'seeker_rows{labels(step=step)} {count}' for step,count in summary['rows'].items()]
+        lines+=[
+            '# HELP seeker_last_run_timestamp_seconds When the last run started.',
+            '# TYPE seeker_last_run_timestamp_seconds gauge',
+            f'seeker_last_run_timestamp_seconds{labels()} {self.started}',
+        ]
+        return lines
+
+    def write_prometheus(self,path):
+        # the textfile collector may read at any time, so write aside and rename
+        tmp_path=Path(f"{path}.{os.getpid()}.tmp")
+        with open(tmp_path,'w') as wf:
+            wf.write('\n'.join(self.prometheus_lines())+'\n')
+        os.replace(tmp_path,path)
+
+
+def timed_stage(metrics,name):
+    # no-op context when metrics are off
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+# =================== HTTP Session =====================
+def create_session(pool_size=MAX_WORKERS,headers=headers):
+    # one keep-alive connection pool shared by all worker threads, retries are handled by request_with_retry
+    session=requests.Session()
+    adapter=HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size,max_retries=0)
+    session.mount('https://',adapter)
+    session.mount('http://',adapter)
+    session.headers.update(headers)
+    return session
+
+
+def parse_retry_after(response):
+    # Retry-After is either delay seconds or an http date
+    value=response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0,float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at=parsedate_to_datetime(value)
+    except (TypeError,ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at=retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0,(retry_at-datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt,retry_after=None):
+    # full jitter exponential backoff, but never earlier than the server asked for
+    delay=random.uniform(0,min(BACKOFF_MAX,BACKOFF_FACTOR*2**attempt))
+    if retry_after is not None:
+        delay=max(delay,min(retry_after,BACKOFF_MAX))
+    return delay
+
+
+def request_with_retry(session,url,params=None,headers=None,timeout=REQUEST_TIMEOUT,retries=MAX_RETRIES,metrics=None,controller=None):
+    for attempt in range(retries+1):
+        response=None
+        status='error'
+        if controller is not None:
+            controller.acquire()
+        start=time.perf_counter()
+        try:
+            response=session.get(url,params=params,headers=headers,timeout=timeout)
+            status=response.status_code
+            if metrics is not None:
+                metrics.observe_request(time.perf_counter()-start,response.status_code,len(response.content))
+            if response.status_code not in RETRY_STATUS:
+                # non retryable 4xx raises straight away
+                response.raise_for_status()
+                return response
+            error=requests.HTTPError(f"{response.status_code} Server Error for url: {response.url}",response=response)
+        except (requests.ConnectionError,requests.Timeout) as e:
+            # a timeout means the site is slow to answer, anything else means it could not be reached at all
+            status='timeout' if isinstance(e,requests.Timeout) else 'error'
+            error=e
+            if metrics is not None:
+                metrics.observe_request(time.perf_counter()-start,'error')
+        finally:
+            if controller is not None:
+                controller.release(time.perf_counter()-start,status,parse_retry_after(response))
+        if attempt==retries:
+            break
+        if metrics is not None:
+            metrics.observe_retry()
+        delay=backoff_delay(attempt,parse_retry_after(response))
+        logger.warning(f"Request to {url} failed ({error}), retry {attempt+1}/{retries} in {delay:.2f}s")
+        time.sleep(delay)
+    raise error
+
+
+# =================== Rate Controller =====================
+class CircuitOpen(requests.ConnectionError):
+    # raised instead of sending a request while the site can't be reached, callers handle it like any connection error
+    pass
+
+
+class RateController:
+    # token bucket pacing plus an AIMD cap on requests in flight, one instance is shared by every query of a run
+    def __init__(self,rate=RATE_LIMIT,max_limit=MAX_WORKERS,burst=RATE_BURST,min_rate=MIN_RATE,circuit_breaker=CIRCUIT_BREAKER):
+        self.lock=threading.Condition()
+        self.max_rate=rate
+        self.min_rate=min(min_rate,rate)
+        self.rate=rate
+        self.burst=burst
+        self.tokens=burst
+        self.refilled=time.monotonic()
+        self.max_limit=max_limit
+        # start halfway and let healthy responses ramp it up
+        self.limit=max(1.0,max_limit/2)
+        self.in_flight=0
+        self.latency=None
+        self.paused_until=0.0
+        self.last_decrease=0.0
+        self.decreases=0
+        self.circuit_breaker=circuit_breaker
+        self.connection_errors=0
+        self.circuit_opened=None
+
+    def _admit(self):
+        # called with the lock held, returns 0 once a request may start, otherwise seconds to wait
+        now=time.monotonic()
+        if self.circuit_opened is not None:
+            if now-self.circuit_opened < CIRCUIT_RESET:
+                raise CircuitOpen(f"{self.connection_errors} connection errors in a row, not sending requests for {CIRCUIT_RESET-(now-self.circuit_opened):.0f}s")
+            # half open, this request is the trial and everyone else keeps failing fast until it comes back
+            self.circuit_opened=now
+        self.tokens=min(self.burst,self.tokens+(now-self.refilled)*self.rate)
+        self.refilled=now
+        if now < self.paused_until:
+            return self.paused_until-now
+        if self.in_flight >= int(self.limit):
+            # release() wakes blocked threads earlier
+            return ADMIT_POLL
+        if self.tokens < 1:
+            return (1-self.tokens)/self.rate
+        self.tokens-=1
+        self.in_flight+=1
+        return 0
+
+    def acquire(self):
+        with self.lock:
+            while wait:=self._admit():
+                self.lock.wait(wait)
+
+    async def acquire_async(self):
+        while True:
+            with self.lock:
+                wait=self._admit()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self,latency,status,retry_after=None):
+        # outcome of one attempt, status is the http status code, 'timeout' or 'error' for a connection that failed
+        with self.lock:
+            self.in_flight-=1
+            now=time.monotonic()
+            if status=='error':
+                # refused or unresolvable, slowing down won't help so only count towards the circuit breaker
+                self.connection_errors+=1
+                if self.connection_errors >= self.circuit_breaker:
+                    if self.circuit_opened is None:
+                        logger.error(f"{self.connection_errors} connection errors in a row, failing requests fast for {CIRCUIT_RESET}s")
+                    # also re-opened when the trial request after CIRCUIT_RESET fails
+                    self.circuit_opened=now
+                self.lock.notify_all()
+                return
+            self.connection_errors=0
+            self.circuit_opened=None
+            overloaded=status=='timeout' or status in RETRY_STATUS
+            spike=not overloaded and self.latency is not None and latency > max(LATENCY_SPIKE*self.latency,LATENCY_SPIKE_MIN)
+            if not overloaded:
+                self.latency=latency if self.latency is None else 0.8*self.latency+0.2*latency
+            if retry_after:
+                self.paused_until=max(self.paused_until,now+min(retry_after,BACKOFF_MAX))
+            if overloaded or spike:
+                # failures from the same window are one congestion signal, cut once per cooldown
+                if now-self.last_decrease >= AIMD_COOLDOWN:
+                    self.limit=max(1.0,self.limit*AIMD_DECREASE)
+                    self.rate=max(self.min_rate,self.rate*AIMD_DECREASE)
+                    self.last_decrease=now
+                    self.decreases+=1
+                    logger.info(f"Backing off after {'a latency spike' if spike else status}, {int(self.limit)} in flight at {self.rate:.1f} req/s")
+            elif status < 400:
+                # additive increase, about one more slot and one more request/sec per window of healthy responses
+                self.limit=min(self.max_limit,self.limit+1/self.limit)
+                self.rate=min(self.max_rate,self.rate+1/self.limit)
+            self.lock.notify_all()
+
+    def report(self):
+        circuit=' Circuit open, the site could not be reached.' if self.circuit_opened is not None else ''
+        return f'Rate controller: {int(self.limit)} in flight at {self.rate:.1f} req/s, backed off {self.decreases} times.'+circuit
+
+
+# =================== Response Cache =====================
+class ResponseCache:
+    # one json file per search page, keyed on the normalized request params
+    def __init__(self,cache_dir=CACHE_DIR,ttl=CACHE_TTL,max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir=Path(cache_dir)
+        self.cache_dir.mkdir(parents=True,exist_ok=True)
+        self.ttl=ttl
+        self.max_bytes=max_bytes
+        self.hits=0
+        self.misses=0
+        self.lock=threading.Lock()
+        self.size=sum(path.stat().st_size for path in self.cache_dir.glob('*.json'))
+
+    @staticmethod
+    def key(url,params):
+        # seek search is case insensitive so keyword and location casing/spacing must not split the cache
+        normalized={k:str(v).strip().lower() for k,v in (params or {}).items()}
+        return hashlib.sha1(json.dumps([url,normalized],sort_keys=True).encode()).hexdigest()
+
+    def get(self,url,params):
+        path=self.cache_dir / f'{self.key(url,params)}.json'
+        try:
+            if time.time()-path.stat().st_mtime <= self.ttl:
+                with open(path,'rb') as rf:
+                    json_combo=json_loads(rf.read())
+                with self.lock:
+                    self.hits+=1
+                return json_combo
+            self._remove(path)
+        except (FileNotFoundError,json.JSONDecodeError):
+            pass
+        with self.lock:
+            self.misses+=1
+        return None
+
+    def set(self,url,params,json_combo):
+        path=self.cache_dir / f'{self.key(url,params)}.json'
+        tmp_path=path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tmp_path,'w') as wf:
+            json.dump(json_combo,wf)
+        size=tmp_path.stat().st_size
+        os.replace(tmp_path,path)
+        with self.lock:
+            self.size+=size
+            over_cap=self.size > self.max_bytes
+        if over_cap:
+            self.evict()
+
+    def _remove(self,path):
+        try:
+            size=path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.size-=size
+
+    def evict(self):
+        # expired entries first, then the oldest ones until the cache is back under its cap
+        entries=sorted(((path.stat().st_mtime,path) for path in self.cache_dir.glob('*.json')),key=lambda entry:entry[0])
+        now=time.time()
+        for mtime,path in entries:
+            if self.size <= self.max_bytes and now-mtime <= self.ttl:
+                break
+            self._remove(path)
+
+    def report(self):
+        total=self.hits+self.misses
+        ratio=self.hits/total if total else 0
+        return f'Response cache: {self.hits} hits, {self.misses} misses ({ratio:.0%} hit rate).'
+
+
+# =================== Job Records =====================
+# listing dates are reported in UTC, the outputs use Brisbane time
+AEST=timezone(offset=timedelta(hours=10))
+AEST_MIN=datetime.min.replace(tzinfo=AEST)
+# below this many jobs fromisoformat per job beats one pandas parse, i.e. every single page
+BULK_PARSE_MIN=256
+# the one placeholder for jobs listed without a work type, also the sheet and partition they are written to
+UNKNOWN_CONTRACT_TYPE='Unknown'
+
+
+@dataclass(slots=True)
+class JobRecord:
+    # one extracted job, fields are the output columns in order minus url
+    job_title: str | None = None
+    job_id: str | None = None
+    isPremium: bool | None = None
+    isStandOut: bool | None = None
+    company_id: str | None = None
+    company: str | None = None
+    area: str | None = None
+    areaId: int | None = None
+    classification_id: str | None = None
+    classification: str | None = None
+    locationId: int | None = None
+    location: str | None = None
+    time_posted: datetime | None = None
+    salary: str | None = None
+    contract_type: str | None = None
+    teaser: str | None = None
+    bullet_pts: str | None = None
+    workArrangements: str | None = None
+    # full ad text, only filled in by enrich_records
+    description: str | None = None
+
+    def as_dict(self):
+        return {name:getattr(self,name) for name in JOB_FIELDS}
+
+
+JOB_FIELDS=tuple(field.name for field in fields(JobRecord))
+record_values=attrgetter(*JOB_FIELDS)
+
+# (field, path into the job json), a missing key anywhere along the path gives None
+JOB_SCHEMA=(
+    ('job_title',('title',)),
+    ('job_id',('id',)),
+    ('isPremium',('isPremium',)),
+    ('isStandOut',('isStandOut',)),
+    ('company_id',('advertiser','id')),
+    ('company',('advertiser','description')),
+    ('area',('areaWhereValue',)),
+    ('areaId',('areaId',)),
+    ('classification_id',('classification','id')),
+    ('classification',('classification','description')),
+    ('locationId',('locationId',)),
+    ('location',('location',)),
+    ('salary',('salary',)),
+    ('contract_type',('workType',)),
+    ('teaser',('teaser',)),
+)
+
+
+def dig(job,path):
+    for key in path:
+        if not isinstance(job,dict):
+            return None
+        job=job.get(key)
+    return job
+
+
+def parse_listing_dates(values):
+    # unparseable or missing dates come back as None instead of failing the whole page
+    if len(values) >= BULK_PARSE_MIN:
+        parsed=pd.to_datetime(pd.Series(values,dtype=object),utc=True,errors='coerce',format='ISO8601').dt.tz_convert(AEST)
+        return [None if ts is pd.NaT else ts.to_pydatetime() for ts in parsed.tolist()]
+    dates=[]
+    for value in values:
+        try:
+            dates.append(datetime.fromisoformat(value).astimezone(AEST))
+        except (TypeError,ValueError):
+            dates.append(None)
+    return dates
+
+
+def decode_job(job):
+    # time_posted is left to parse_listing_dates so a whole chunk is parsed at once
+    record=JobRecord(**{name:dig(job,path) for name,path in JOB_SCHEMA})
+    record.contract_type=record.contract_type or UNKNOWN_CONTRACT_TYPE
+    # 'bulletPoints': ['Hybrid working - Brisbane Office', 'Competitive salary that reflects your skills and experience.', 'Strong focus on the use and integration of AI']
+    record.bullet_pts=' - '.join(x for x in dig(job,('bulletPoints',)) or [] if isinstance(x,str))
+    # [{'id':1,'label':{'text':'On-site'}},{'id':2,'label':{'text':'Hybrid'}}]
+    record.workArrangements=' & '.join(text for text in (dig(x,('label','text')) for x in dig(job,('workArrangements','data')) or []) if text)
+    return record
+
+
+def iter_info_from_json(jobs,chunk_size=1000):
+    # lazy version of extract_info_from_json, decoded a chunk at a time so listing dates are parsed in bulk
+    logger.debug(f"Now extracting fields from all scraped job details...")
+    debug=logger.isEnabledFor(logging.DEBUG)
+    jobs=iter(jobs)
+    count=0
+    # jobs without a usable listing date are dated when they were found, so they expire expiry days after that
+    # instead of being kept by the first write and dropped as NaT by the next merge
+    found_at=datetime.now(AEST).replace(microsecond=0)
+    while chunk:=list(islice(jobs,chunk_size)):
+        dates=parse_listing_dates([dig(job,('listingDate',)) for job in chunk])
+        for job,time_posted in zip(chunk,dates):
+            record=decode_job(job)
+            record.time_posted=time_posted or found_at
+            if debug:
+                logger.debug(f"Exctracted <{record.job_title} - {record.company}>")
+            yield record
+        count+=len(chunk)
+    logger.debug(f"Done extracting all {count} jobs")
+
+
+def extract_info_from_json(jobs,metrics=None):
+    with timed_stage(metrics,'extract'):
+        return list(iter_info_from_json(jobs))
 
 
 # =================== Core Functions =====================
-def update_classification_list():
-    res = requests.get(r'https://www.seek.com.au/',headers=headers)
+def update_classification_list(session=None):
+    # bs4 is only needed here, keep it off the import path of every crawl
+    from bs4 import BeautifulSoup
+    session=session or create_session(pool_size=1)
+    res = request_with_retry(session,r'https://www.seek.com.au/')
     soup = BeautifulSoup(res.text,'html.parser')
 
     # get classification drop down list
@@ -78,7 +626,7 @@ def update_classification_list():
 #     return elem_found.text.replace(chr(8211),'-') if elem_found else None
 
 
-def file_name_formatter(keyword,subclassification,location,with_timestamp=False):
+def file_name_formatter(keyword,subclassification,location,with_timestamp=False,ext='.xlsx'):
     # clean inputs
     keyword,subclassification,location = [*map(lambda x:x.strip().lower(),[keyword,subclassification,location])]
     # init timestamp
@@ -91,46 +639,11 @@ def file_name_formatter(keyword,subclassification,location,with_timestamp=False)
     # append timestamp if turned on
     if with_timestamp:
         timestamp=datetime.now().strftime(r'_%Y%m%d%H%M%S')
-    return fname + timestamp + '.xlsx'
+    return fname + timestamp + ext
 
 
-def extract_info_from_json(jobs):
-    logger.debug(f"Now extracting fields from all scraped job details...")
-    outputs = []
-    for job in jobs:
-        this_job = {}
-        
-        # get job id, job_title, job_link, company, company_id etc
-        this_job['job_title'] = job.get('title')
-        this_job['job_id'] = job.get('id')
-        this_job['isPremium'] = job.get('isPremium')
-        this_job['isStandOut'] = job.get('isStandOut')
-        this_job['company_id'] = job.get('advertiser').get('id')
-        this_job['company'] = job.get('advertiser').get('description')
-        this_job['area'] = job.get('areaWhereValue')
-        this_job['areaId'] = job.get('areaId')
-        this_job['classification_id'] = job.get('classification').get('id')
-        this_job['classification'] = job.get('classification').get('description')
-        this_job['locationId'] = job.get('locationId')
-        this_job['location'] = job.get('location')
-        this_job['time_posted'] = datetime.fromisoformat(job.get('listingDate')).astimezone(timezone(offset=timedelta(hours=10)))
-        this_job['salary'] = job.get('salary')
-        this_job['contract_type'] = job.get('workType')
-        this_job['teaser'] = job.get('teaser')
-        # 'bulletPoints': ['Hybrid working - Brisbane Office', 'Competitive salary that reflects your skills and experience.', 'Strong focus on the use and integration of AI']
-        this_job['bullet_pts'] = ' - '.join([x for x in job.get('bulletPoints')])
-        # [{'id':1,'label':{'text':'On-site'}},{'id':2,'label':{'text':'Hybrid'}}]
-        this_job['workArrangements'] = ' & '.join([x.get('label').get('text') for x in job.get('workArrangements').get('data')])
-
-        outputs.append(this_job)
-        logger.debug(f"Exctracted <{this_job['job_title']} - {this_job['company']}>")
-    logger.debug(f"Done extracting all {len(jobs)} jobs")
-    return outputs
-
-
-def seek_crawler(keyword,subclass,location,BASE_URL,headers,pageNum=1):
-    # construct url
-    params = {
+def build_params(keyword,subclass,location,pageNum=1,work_type='',sort_mode=''):
+    params={
         'siteKey': 'AU-Main',
         'where': location,
         'page': pageNum,
@@ -140,98 +653,829 @@ def seek_crawler(keyword,subclass,location,BASE_URL,headers,pageNum=1):
         'classification': classifications[subclass],
         'locale': 'en-AU',
     }
+    if work_type:
+        params['worktype']=work_type
+    if sort_mode:
+        params['sortmode']=sort_mode
+    return params
 
-    # make request
+
+def fetch_search_page(keyword,subclass,location,BASE_URL,headers,pageNum=1,session=None,cache=None,metrics=None,controller=None,work_type='',sort_mode=''):
+    # returns the decoded json of one search page, None if it could not be retrieved
+    params = build_params(keyword,subclass,location,pageNum,work_type,sort_mode)
+    if cache is not None:
+        json_combo=cache.get(BASE_URL,params)
+        if json_combo is not None:
+            return json_combo
+    session=session or create_session(pool_size=1)
     try:
         logger.debug(f"Now retriving {keyword} jobs page {pageNum} from seek...")
-        response = requests.get(BASE_URL, params=params, headers=headers)
-        response.raise_for_status()
-    except Exception as e:
-        logger.error(f"An error occurred when getting job details with msg:\n{e}")
-    json_combo = response.json()
-    jobs = json_combo.get('data')
+        response = request_with_retry(session, BASE_URL, params=params, headers=headers, metrics=metrics, controller=controller)
+        json_combo = json_loads(response.content)
+    except (requests.RequestException,ValueError) as e:
+        logger.error(f"An error occurred when getting job details of page {pageNum} with msg:\n{e}")
+        return None
     logger.debug(f"job details retrieved with {params=}")
+    if cache is not None:
+        cache.set(BASE_URL,params,json_combo)
+    return json_combo
+
+
+def seek_crawler(keyword,subclass,location,BASE_URL,headers,pageNum=1,session=None):
+    json_combo = fetch_search_page(keyword,subclass,location,BASE_URL,headers,pageNum,session)
+    jobs = (json_combo or {}).get('data') or []
     
     # format scraped data
     outputs = extract_info_from_json(jobs)
     return outputs
 
 
+def count_pages(json_combo):
+    # number of result pages reported by the api, None if the response has no paging metadata
+    total=json_combo.get('totalCount')
+    jobs=json_combo.get('data') or []
+    # premium listings are served on top of the organic page size so they don't count towards it
+    page_size=sum(not job.get('isPremium') for job in jobs) or len(jobs)
+    if total is None or not page_size:
+        return None
+    return math.ceil(total/page_size)
+
+
+class SearchUnavailable(Exception):
+    # page 1 of a search failed after every retry, i.e. a fetch error and not an empty result
+    pass
+
+
+def require_first_page(first_page,keyword,location):
+    if first_page is None:
+        raise SearchUnavailable(f"Page 1 of {keyword or 'any'} jobs in {location or 'any location'} could not be retrieved")
+    return first_page
+
+
+def plan_last_page(first_page,pages_to_parse):
+    # work out the last page worth requesting from the first response
+    if first_page is None:
+        # page 1 failed after every retry, scheduling the rest would only repeat the failure
+        return 0
+    if not first_page.get('data'):
+        return 1
+    max_page=count_pages(first_page)
+    if max_page is not None and max_page < pages_to_parse:
+        logger.info(f"User defined number of pages to parse {pages_to_parse} is more than available pages {max_page}, pages to parse modified")
+        return max_page
+    return pages_to_parse
+
+
+def is_cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+
+def crawl_remaining_pages(fetch,shards,first_pages,last_pages,executor,parse=None,progress=None,cancel=None):
+    # the one page loop of the threaded crawls, pages 2..last of every shard go through the executor,
+    # fetch(shard,pageNum) returns a page json or None and parse(jobs) runs in the worker on each page's jobs.
+    # last_pages is shared by the workers and lowered as soon as a shard returns an empty page,
+    # returns the parsed pages of each shard in page order, first pages included
+    parse=parse or (lambda jobs:jobs)
+    pages_done=[len(shards)]
+    lock=threading.Lock()
+    if progress:
+        progress(pages_done[0],sum(last_pages))
+
+    def crawl_one(i,pageNum):
+        if pageNum > last_pages[i] or is_cancelled(cancel):
+            return parse([])
+        json_combo=fetch(shards[i],pageNum)
+        if json_combo is not None and not json_combo.get('data'):
+            last_pages[i]=min(last_pages[i],pageNum-1)
+        with lock:
+            pages_done[0]+=1
+            if progress:
+                progress(min(pages_done[0],sum(last_pages)),sum(last_pages))
+        return parse((json_combo or {}).get('data') or [])
+
+    futures=[[executor.submit(crawl_one,i,pageNum) for pageNum in range(2,last_pages[i]+1)] for i in range(len(shards))]
+    return [
+        [parse((first_page or {}).get('data') or [])]+[future.result() for future in shard_futures]
+        for first_page,shard_futures in zip(first_pages,futures)
+    ]
+
+
+def crawl_pages(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,max_workers=MAX_WORKERS,session=None,cache=None,progress=None,cancel=None,metrics=None,controller=None):
+    # progress(pages_done,pages_total) is called from the worker threads, cancel is a threading.Event
+    own_session=session is None
+    session=session or create_session(pool_size=max_workers,headers=headers)
+
+    def fetch(shard,pageNum):
+        return fetch_search_page(keyword,subclassification,location,BASE_URL,headers,pageNum,session,cache,metrics,controller)
+
+    try:
+        first_page=require_first_page(fetch(None,1),keyword,location)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # a single shard, each page is extracted in the worker that fetched it
+            pages,=crawl_remaining_pages(fetch,[None],[first_page],[plan_last_page(first_page,pages_to_parse)],executor,
+                                         lambda jobs:extract_info_from_json(jobs,metrics),progress,cancel)
+    finally:
+        if own_session:
+            session.close()
+    return [record for page in pages for record in page]
+
+
+# =================== Job Details =====================
+class DetailCache:
+    # job_id -> description, written from the calling thread only
+    def __init__(self,path=DETAIL_CACHE):
+        self.conn=sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS details (job_id TEXT PRIMARY KEY, description TEXT, fetched_at REAL)')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.conn.close()
+
+    def get_many(self,job_ids):
+        found={}
+        job_ids=list(job_ids)
+        # stay under sqlite's bound parameter limit
+        for start in range(0,len(job_ids),500):
+            chunk=job_ids[start:start+500]
+            rows=self.conn.execute(f"SELECT job_id, description FROM details WHERE job_id IN ({', '.join('?'*len(chunk))})",chunk)
+            found.update(rows)
+        return found
+
+    def set_many(self,descriptions):
+        now=time.time()
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO details VALUES (?, ?, ?)',[(job_id,description,now) for job_id,description in descriptions.items()])
+
+
+def fetch_job_description(session,job_id,metrics=None,controller=None):
+    # ad text of one job, '' for an ad that was taken down, None if it could not be retrieved this time
+    from bs4 import BeautifulSoup
+    try:
+        response=request_with_retry(session,JOB_URL.format(job_id),metrics=metrics,controller=controller)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code in (404,410):
+            return ''
+        logger.error(f"An error occurred when getting details of job {job_id} with msg:\n{e}")
+        return None
+    except requests.RequestException as e:
+        logger.error(f"An error occurred when getting details of job {job_id} with msg:\n{e}")
+        return None
+    details=BeautifulSoup(response.text,'html.parser').select_one('div[data-automation="jobAdDetails"]')
+    return details.get_text('\n',strip=True) if details else ''
+
+
+def enrich_records(records,max_workers=DETAIL_WORKERS,cache_path=DETAIL_CACHE,session=None,metrics=None,controller=None,fetch=True):
+    # fills record.description in place, only job ids never fetched before hit the site,
+    # with fetch off it is a cache lookup only so a run without enrichment doesn't blank stored descriptions
+    records=list(records)
+    if not fetch and not Path(cache_path).exists():
+        return 0
+    job_ids=[*dict.fromkeys(str(record.job_id) for record in records)]
+    own_session=session is None
+    with DetailCache(cache_path) as detail_cache:
+        descriptions=detail_cache.get_many(job_ids)
+        missing=[job_id for job_id in job_ids if job_id not in descriptions] if fetch else []
+        if missing:
+            session=session or create_session(pool_size=max_workers,headers=headers)
+            try:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    fetched=dict(zip(missing,executor.map(lambda job_id:fetch_job_description(session,job_id,metrics,controller),missing)))
+            finally:
+                if own_session:
+                    session.close()
+            # failed fetches are left out so the next run retries them
+            fetched={job_id:description for job_id,description in fetched.items() if description is not None}
+            detail_cache.set_many(fetched)
+            descriptions.update(fetched)
+        else:
+            fetched={}
+    for record in records:
+        record.description=descriptions.get(str(record.job_id))
+    if metrics is not None:
+        metrics.add_rows('details_cached',len(job_ids)-len(missing))
+        metrics.add_rows('details_fetched',len(fetched))
+        metrics.add_rows('details_failed',len(missing)-len(fetched))
+    return len(fetched)
+
+
+# =================== Sharded Crawl =====================
+def split_shard(subclass,work_type):
+    # the next finer facet of a slice, classifications first then work types, [] once it can't be split further
+    if not subclass:
+        return [(name,work_type) for name in classifications if name]
+    if not work_type:
+        return [(subclass,work_type_id) for work_type_id in WORK_TYPES.values()]
+    return []
+
+
+def crawl_sharded(keyword,subclassification,location,BASE_URL,headers,max_workers=MAX_WORKERS,page_ceiling=API_PAGE_CEILING,session=None,cache=None,progress=None,cancel=None,metrics=None,controller=None):
+    # every job of a query too broad for the page ceiling, each slice is crawled to its last page
+    own_session=session is None
+    session=session or create_session(pool_size=max_workers,headers=headers)
+
+    def fetch(shard,pageNum):
+        subclass,work_type=shard
+        return fetch_search_page(keyword,subclass,location,BASE_URL,headers,pageNum,session,cache,metrics,controller,work_type)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # plan level by level, first pages of a level are fetched together and a slice over the ceiling is re-split
+            shards,first_pages,last_pages=[],[],[]
+            level=[(subclassification,'')]
+            while level and not is_cancelled(cancel):
+                next_level=[]
+                for shard,first_page in zip(level,executor.map(lambda shard:fetch(shard,1),level)):
+                    if first_page is None:
+                        # the whole query failing is a fetch error, one failed slice is skipped so the rest still count
+                        if shard==(subclassification,''):
+                            require_first_page(first_page,keyword,location)
+                        logger.error(f"Slice {shard} could not be retrieved, its jobs are missing from this run")
+                        continue
+                    max_page=count_pages(first_page)
+                    if max_page is not None and max_page > page_ceiling:
+                        finer=split_shard(*shard)
+                        if finer:
+                            next_level.extend(finer)
+                            continue
+                        logger.warning(f"Slice {shard} still has {max_page} pages, only the first {page_ceiling} can be crawled")
+                    shards.append(shard)
+                    first_pages.append(first_page)
+                    last_pages.append(plan_last_page(first_page,page_ceiling))
+                level=next_level
+            logger.info(f"{keyword or 'any'} jobs in {location or 'any location'} split into {len(shards)} slices")
+            shard_pages=crawl_remaining_pages(fetch,shards,first_pages,last_pages,executor,progress=progress,cancel=cancel)
+    finally:
+        if own_session:
+            session.close()
+
+    # premium listings are repeated on every page and slices can overlap, extract each job id once
+    unique_jobs={}
+    for jobs in (jobs for pages in shard_pages for jobs in pages):
+        for job in jobs:
+            unique_jobs.setdefault(str(job.get('id')),job)
+    if metrics is not None:
+        metrics.add_rows('shards',len(shards))
+    return extract_info_from_json(unique_jobs.values(),metrics)
+
+
+# =================== Incremental Crawl =====================
+def load_watermark(key,path=WATERMARK_FILE):
+    try:
+        with open(path,'r') as rf:
+            entry=json.load(rf).get(key)
+    except (FileNotFoundError,json.JSONDecodeError):
+        return None
+    if not entry:
+        return None
+    return {'newest_listing':datetime.fromisoformat(entry['newest_listing']),'job_ids':set(entry['job_ids'])}
+
+
+def save_watermark(key,newest_listing,job_ids,path=WATERMARK_FILE):
+    try:
+        with open(path,'r') as rf:
+            watermarks=json.load(rf)
+    except (FileNotFoundError,json.JSONDecodeError):
+        watermarks={}
+    watermarks[key]={'newest_listing':newest_listing.isoformat(),'job_ids':sorted(job_ids)}
+    # write then swap so a crash never leaves a half written file
+    tmp_path=Path(f"{path}.tmp")
+    with open(tmp_path,'w') as wf:
+        json.dump(watermarks,wf)
+    os.replace(tmp_path,path)
+
+
+def is_page_stale(records,watermark):
+    # a page is stale when every job on it is already known or was listed before the watermark,
+    # records are the extracted page so bad or missing dates were already dealt with (dated when found)
+    for record in records:
+        if str(record.job_id) in watermark['job_ids']:
+            continue
+        if record.time_posted is None or record.time_posted > watermark['newest_listing']:
+            return False
+    return True
+
+
+def crawl_pages_incremental(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,watermark,session=None,cache=None,progress=None,cancel=None,metrics=None,controller=None):
+    # results are requested newest first so pages are walked in order until one holds nothing new,
+    # the default relevance order would stop at the first page of old jobs with new ones still further down
+    own_session=session is None
+    session=session or create_session(pool_size=1,headers=headers)
+    outputs=[]
+    try:
+        last_page=pages_to_parse
+        pageNum=1
+        while pageNum <= last_page and not is_cancelled(cancel):
+            json_combo=fetch_search_page(keyword,subclassification,location,BASE_URL,headers,pageNum,session,cache,metrics,controller,sort_mode=LISTED_DATE_SORT)
+            if pageNum==1:
+                last_page=plan_last_page(require_first_page(json_combo,keyword,location),pages_to_parse)
+            if progress:
+                progress(pageNum,last_page)
+            jobs=(json_combo or {}).get('data') or []
+            if json_combo is not None and not jobs:
+                break
+            records=extract_info_from_json(jobs,metrics)
+            outputs.extend(records)
+            if records and is_page_stale(records,watermark):
+                logger.info(f"Page {pageNum} is older than the last run, stop crawling")
+                break
+            pageNum+=1
+    finally:
+        if own_session:
+            session.close()
+    return outputs
+
+
+# =================== Asyncio Engine =====================
+ASYNC_ERRORS=(requests.RequestException,ValueError,asyncio.TimeoutError)+((aiohttp.ClientError,) if aiohttp else ())
+
+
+def create_async_session(concurrency=MAX_WORKERS,headers=headers):
+    if aiohttp is None:
+        return create_session(pool_size=concurrency,headers=headers)
+    connector=aiohttp.TCPConnector(limit=concurrency)
+    timeout=aiohttp.ClientTimeout(sock_connect=REQUEST_TIMEOUT[0],sock_read=REQUEST_TIMEOUT[1])
+    return aiohttp.ClientSession(headers=headers,connector=connector,timeout=timeout)
+
+
+async def async_request_json(session,url,params=None,retries=MAX_RETRIES,metrics=None,controller=None):
+    # without aiohttp the blocking request runs on the default executor
+    if aiohttp is None:
+        response=await asyncio.to_thread(request_with_retry,session,url,params,metrics=metrics,controller=controller)
+        return json_loads(response.content)
+
+    # aiohttp only accepts str/int/float query values
+    params={k:str(v) for k,v in (params or {}).items()}
+    for attempt in range(retries+1):
+        response=None
+        status='error'
+        if controller is not None:
+            await controller.acquire_async()
+        start=time.perf_counter()
+        try:
+            async with session.get(url,params=params) as response:
+                body=await response.read()
+                status=response.status
+                if metrics is not None:
+                    metrics.observe_request(time.perf_counter()-start,response.status,len(body))
+                if response.status not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return json_loads(body)
+                error=aiohttp.ClientResponseError(response.request_info,response.history,status=response.status,message=response.reason,headers=response.headers)
+        except (aiohttp.ClientConnectionError,asyncio.TimeoutError) as e:
+            status='timeout' if isinstance(e,asyncio.TimeoutError) else 'error'
+            error=e
+            if metrics is not None:
+                metrics.observe_request(time.perf_counter()-start,'error')
+        finally:
+            if controller is not None:
+                controller.release(time.perf_counter()-start,status,parse_retry_after(response))
+        if attempt==retries:
+            break
+        if metrics is not None:
+            metrics.observe_retry()
+        delay=backoff_delay(attempt,parse_retry_after(response))
+        logger.warning(f"Request to {url} failed ({error!r}), retry {attempt+1}/{retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+    raise error
+
+
+async def fetch_search_page_async(keyword,subclass,location,BASE_URL,pageNum,session,cache=None,metrics=None,controller=None):
+    params = build_params(keyword,subclass,location,pageNum)
+    if cache is not None:
+        json_combo=cache.get(BASE_URL,params)
+        if json_combo is not None:
+            return json_combo
+    try:
+        logger.debug(f"Now retriving {keyword} jobs page {pageNum} from seek...")
+        json_combo=await async_request_json(session,BASE_URL,params=params,metrics=metrics,controller=controller)
+    except ASYNC_ERRORS as e:
+        logger.error(f"An error occurred when getting job details of page {pageNum} with msg:\n{e}")
+        return None
+    if cache is not None:
+        cache.set(BASE_URL,params,json_combo)
+    return json_combo
+
+
+async def crawl_pages_async(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,concurrency=MAX_WORKERS,session=None,cache=None,progress=None,cancel=None,metrics=None,controller=None):
+    if aiohttp is None:
+        logger.warning("aiohttp is not installed, the async engine runs every request on the default thread pool (pip install -r requirements.txt)")
+    semaphore=asyncio.Semaphore(concurrency)
+    own_session=session is None
+    session=session or create_async_session(concurrency=concurrency,headers=headers)
+    try:
+        first_page=await fetch_search_page_async(keyword,subclassification,location,BASE_URL,1,session,cache,metrics,controller)
+        last_page=plan_last_page(require_first_page(first_page,keyword,location),pages_to_parse)
+        pages_done=1
+        if progress:
+            progress(1,last_page)
+
+        async def crawl_one(pageNum):
+            nonlocal last_page,pages_done
+            async with semaphore:
+                if pageNum > last_page or is_cancelled(cancel):
+                    return []
+                json_combo=await fetch_search_page_async(keyword,subclassification,location,BASE_URL,pageNum,session,cache,metrics,controller)
+            if json_combo is not None and not json_combo.get('data'):
+                last_page=min(last_page,pageNum-1)
+            pages_done+=1
+            if progress:
+                progress(min(pages_done,last_page),last_page)
+            # parse as soon as the page arrives, other pages keep downloading meanwhile
+            return extract_info_from_json((json_combo or {}).get('data') or [],metrics)
+
+        results=await asyncio.gather(*(crawl_one(pageNum) for pageNum in range(2,last_page+1)))
+    finally:
+        if own_session:
+            if aiohttp is None:
+                session.close()
+            else:
+                await session.close()
+    # keep page order so results match the threads engine
+    return extract_info_from_json((first_page or {}).get('data') or [],metrics)+[job for page in results for job in page]
+
+
 def create_df(outputs):
-    df = pd.DataFrame(outputs)
-    df['url']=df['job_id'].apply(lambda x: f"https://www.seek.com.au/job/{x}")
+    # records are built from plain tuples, much cheaper than letting pandas convert each dataclass
+    df = pd.DataFrame.from_records([record_values(record) for record in outputs],columns=JOB_FIELDS)
+    df['url']=df['job_id'].astype(str).map(JOB_URL.format)
+    return apply_job_schema(drop_empty_description(df))
+
+
+def drop_empty_description(df):
+    # description is only an output column once some run was enriched
+    if 'description' in df and df['description'].isna().all():
+        return df.drop(columns='description')
     return df
 
 
+def sheet_name(contract_type):
+    # excel sheet names can't hold '/', every writer names its sheets the same way
+    if not isinstance(contract_type,str) or not contract_type:
+        return UNKNOWN_CONTRACT_TYPE
+    return contract_type.replace('/','_')
+
+
 def write_df_to_xlsx(df,fullname):
     # convert time_posted column to timezone naive format
     df['time_posted']=df['time_posted'].dt.tz_localize(None)
     with pd.ExcelWriter(fullname, engine='openpyxl') as writer:
         # Write each DataFrame to a different sheet depending on unique value in contract type
-        for contract_type in df['contract_type'].unique():
-            tabname=contract_type.replace('/','_')
-            df_tab=df.loc[df['contract_type']==contract_type,]
-            df_tab.to_excel(writer,sheet_name=tabname,index=False,header=True)
+        # one groupby pass instead of a mask per contract type, sort=False keeps first seen order
+        # observed=True so categories with no rows left don't become empty sheets, rows without a contract type
+        # (older histories) go to the same sheet as new ones instead of being dropped by groupby
+        contract_types=df['contract_type'].astype(object).fillna(UNKNOWN_CONTRACT_TYPE)
+        for contract_type, df_tab in df.groupby(contract_types,sort=False,observed=True,dropna=False):
+            df_tab.to_excel(writer,sheet_name=sheet_name(contract_type),index=False,header=True)
 
 
-def main(BASE_URL,headers,keyword,subclassification,location,pages_to_parse,expiry,SAVE_DIR):
-    
-    # get filename for future IO operations
-    fname=file_name_formatter(keyword,subclassification,location)
-    fullname = SAVE_DIR / fname
+def write_df_to_csv(df,fullname):
+    df['time_posted']=df['time_posted'].dt.tz_localize(None)
+    df.to_csv(fullname,index=False)
 
-    # init results container
-    outputs=[]
 
-    # modify max page if not enough pages to parse
-    # max_page = seek_maxPage(keyword,subclassification,location,search_pattern,BASE_URL,headers)
-    # if max_page < pages_to_parse:
-    #     logger.info(f"User defined number of pages to parse {pages_to_parse} is more than available pages {max_page}, pages to parse modified")
-    #     pages_to_parse = max_page
-    
-    # run main function in threads
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(seek_crawler,keyword,subclassification,location,BASE_URL,headers,i+1) for i in range(pages_to_parse)]
-
-    for future in futures:
-        output=future.result()
-        # outputs.append(output)
-        outputs.extend(output)
-    
-    # create df from outputs
-    df=create_df(outputs).sort_values(by='time_posted',ascending=False).drop_duplicates(subset='job_id')
+# date_posted partition for rows without a time_posted
+UNDATED_PARTITION='undated'
+
+
+def write_df_to_parquet(df,fullname):
+    # hive style dataset partitioned by contract_type=<..>/date_posted=<..>
+    df['time_posted']=df['time_posted'].dt.tz_localize(None)
+    # a null partition key becomes __HIVE_DEFAULT_PARTITION__ which the next read can't unify, so both keys get a placeholder
+    df=df.assign(
+        contract_type=df['contract_type'].astype(object).fillna(UNKNOWN_CONTRACT_TYPE),
+        date_posted=df['time_posted'].dt.strftime(r'%Y-%m-%d').fillna(UNDATED_PARTITION),
+    )
+    # partitions of expired days must not linger, so write aside and swap the whole dataset in
+    tmp_dir=Path(f"{fullname}.tmp")
+    shutil.rmtree(tmp_dir,ignore_errors=True)
+    df.to_parquet(tmp_dir,partition_cols=['contract_type','date_posted'],index=False)
+    shutil.rmtree(fullname,ignore_errors=True)
+    os.replace(tmp_dir,fullname)
+
+
+def read_xlsx_history(fullname):
+    # read data from all sheets of the existing xlsx in one concat
+    df_exist=pd.read_excel(fullname,header=0,sheet_name=None)
+    return apply_job_schema(pd.concat(df_exist.values(),ignore_index=True))
 
-    # csv operations
-    # open csv with fname if exists, if not save df as csv directly
-    try:
-        df_exist=pd.read_excel(fullname,header=0,sheet_name=None)
-        df_old=pd.DataFrame(columns=df.columns)
-        # read data from the existing xlsx as df_old
-        for sheet_name, df0 in df_exist.items():
-            df_old=pd.concat([df_old, df0])
-        
-        # convert time posted column from xlsx file to python datetime object
-        df_old['time_posted'] = pd.to_datetime(df_old['time_posted']).dt.to_pydatetime()
 
+def read_csv_history(fullname):
+    return apply_job_schema(pd.read_csv(fullname,dtype={'job_id':str},parse_dates=['time_posted']))
+
+
+def read_parquet_history(fullname):
+    # date_posted is only a partition key, undated rows keep their NaT time_posted from the files
+    df=pd.read_parquet(fullname).drop(columns='date_posted')
+    # partition columns come back as categoricals of the partition values, rebuilt from the data,
+    # missing contract types were written as UNKNOWN_CONTRACT_TYPE and stay that placeholder
+    df['contract_type']=df['contract_type'].astype(str)
+    return apply_job_schema(df)
+
+
+WRITERS={'xlsx':write_df_to_xlsx,'csv':write_df_to_csv,'parquet':write_df_to_parquet}
+READERS={'xlsx':read_xlsx_history,'csv':read_csv_history,'parquet':read_parquet_history}
+# parquet output is a partitioned directory
+EXTENSIONS={'xlsx':'.xlsx','csv':'.csv','parquet':'.parquet'}
+
+
+def merge_history(df,fullname,expiry,output_format='xlsx',metrics=None):
+    # merge with the existing history if there is one, if not save df directly
+    if not Path(fullname).exists():
+        with timed_stage(metrics,'write'):
+            WRITERS[output_format](df,fullname)
+        return df
+
+    with timed_stage(metrics,'read'):
+        # readers return the compact schema, time_posted already a datetime64 column
+        df_old=READERS[output_format](fullname)
+    if metrics is not None:
+        metrics.add_rows('history',len(df_old))
+
+    with timed_stage(metrics,'merge'):
         # convert df time_posted(datetime tz column) to tz-naive column
         df['time_posted']=df['time_posted'].dt.tz_localize(None)
 
+        if 'description' in df_old:
+            # new rows win the dedupe below, a run without enrichment must not blank the descriptions they had
+            old_descriptions=df_old.dropna(subset=['description']).drop_duplicates(subset='job_id').set_index('job_id')['description']
+            new_descriptions=df['description'] if 'description' in df else pd.Series(None,index=df.index,dtype=object)
+            df['description']=new_descriptions.fillna(df['job_id'].map(old_descriptions))
+
         # compare job id column and remove duplicates
         df=pd.concat([df,df_old],ignore_index=True).drop_duplicates(subset=['job_id',],keep='first',ignore_index=True)
+        df=drop_empty_description(df)
+        # concat of categoricals with different categories falls back to object, compact it again
+        df=apply_job_schema(df)
+        rows_after_dedupe=len(df)
 
-        # remove row that is older than expiry days
-        expiry_flags=df['time_posted'].apply(lambda timestamp:datetime.now()-timestamp <= timedelta(days=expiry))
-        df=df[expiry_flags]
+        # remove row that is older than expiry days, now() is taken once for the whole column
+        cutoff=datetime.now()-timedelta(days=expiry)
+        df=df[df['time_posted'] >= cutoff]
 
         # sort by time posted but put Featured on top
         df=df.sort_values(by='time_posted',ascending=False)
+    if metrics is not None:
+        metrics.add_rows('after_dedupe',rows_after_dedupe)
+        metrics.add_rows('after_expiry',len(df))
+
+    # override existing history
+    with timed_stage(metrics,'write'):
+        WRITERS[output_format](df,fullname)
+    return df
+
+
+def iter_sheet_records(ws):
+    # rows of a read only worksheet as dicts, one row held at a time
+    rows=ws.iter_rows(values_only=True)
+    header=next(rows,None)
+    if header is None:
+        return
+    for row in rows:
+        yield dict(zip(header,row))
+
+
+def xlsx_has_column(fullname,column):
+    # reads the header rows only
+    if not Path(fullname).exists():
+        return False
+    import openpyxl
+    wb=openpyxl.load_workbook(fullname,read_only=True)
+    try:
+        return any(column in (next(ws.iter_rows(max_row=1,values_only=True),None) or ()) for ws in wb.worksheets)
+    finally:
+        wb.close()
+
+
+def stream_merge(records,expiry):
+    # first record of each job id wins and expired ones are dropped; only job ids are kept in memory
+    cutoff=datetime.now()-timedelta(days=expiry)
+    seen=set()
+    for record in records:
+        job_id=str(record['job_id'])
+        if job_id in seen or record['time_posted'] is None or record['time_posted'] < cutoff:
+            continue
+        seen.add(job_id)
+        yield record
+
+
+def write_records_to_xlsx(records,fullname,columns=JOB_COLUMNS):
+    import openpyxl
+    # write only workbook streams every sheet's rows to disk as they are appended
+    wb=openpyxl.Workbook(write_only=True)
+    sheets={}
+    count=0
+    for record in records:
+        # keyed by sheet name so None from an older history and the Unknown placeholder share one sheet
+        tabname=sheet_name(record['contract_type'])
+        ws=sheets.get(tabname)
+        if ws is None:
+            ws=sheets[tabname]=wb.create_sheet(title=tabname)
+            ws.append(columns)
+        ws.append([record.get(col) for col in columns])
+        count+=1
+    if not sheets:
+        wb.create_sheet()
+    # the old workbook is still being read while records stream in, so swap it in once done
+    tmp_name=Path(fullname).with_suffix('.tmp.xlsx')
+    wb.save(tmp_name)
+    os.replace(tmp_name,fullname)
+    return count
+
+
+def merge_xlsx_history_streaming(outputs,fullname,expiry,metrics=None):
+    # only the new records are sorted in memory, the history is streamed from and to disk
+    new_records=[
+        dict(record.as_dict(),time_posted=record.time_posted and record.time_posted.replace(tzinfo=None),url=JOB_URL.format(record.job_id))
+        for record in sorted(outputs,key=lambda record:record.time_posted or AEST_MIN,reverse=True)
+    ]
+    new_ids={str(record['job_id']) for record in new_records}
+    job_ids=set()
+    # the description column is only written once some run was enriched
+    columns=JOB_COLUMNS
+    if all(record['description'] is None for record in new_records) and not xlsx_has_column(fullname,'description'):
+        columns=[col for col in JOB_COLUMNS if col!='description']
+
+    def sorted_records():
+        if not Path(fullname).exists():
+            yield from new_records
+            return
+        import openpyxl
+        wb=openpyxl.load_workbook(fullname,read_only=True)
+        try:
+            # every history sheet is sorted newest first so a k-way merge keeps the output sorted
+            sheets=[(record for record in iter_sheet_records(ws) if str(record['job_id']) not in new_ids) for ws in wb.worksheets]
+            yield from heapq.merge(new_records,*sheets,key=lambda record:record['time_posted'] or datetime.min,reverse=True)
+        finally:
+            wb.close()
+
+    def tracked_records():
+        for record in stream_merge(sorted_records(),expiry):
+            job_ids.add(str(record['job_id']))
+            yield record
+
+    # reading, merging and writing are interleaved here so they are timed as one stage
+    with timed_stage(metrics,'merge_write'):
+        total=write_records_to_xlsx(tracked_records(),fullname,columns)
+    if metrics is not None:
+        metrics.add_rows('after_expiry',total)
+    return total,job_ids
+
+
+def merge_store_history(df,db_path,expiry,export_to=None,output_format='xlsx',metrics=None):
+    # upsert only the new rows and expire with an indexed delete, history is never reread
+    df['time_posted']=df['time_posted'].dt.tz_localize(None)
+    with JobStore(db_path) as store:
+        with timed_stage(metrics,'merge'):
+            store.upsert(df)
+            expired=store.expire(expiry)
+        if export_to:
+            with timed_stage(metrics,'write'):
+                WRITERS[output_format](drop_empty_description(store.to_df()),export_to)
+        total=len(store)
+        if metrics is not None:
+            metrics.add_rows('expired',expired)
+            metrics.add_rows('after_expiry',total)
+        return total,store.job_ids()
+
+
+def save_results(outputs,fullname,expiry,store=False,export=None,streaming=False,output_format='xlsx',metrics=None):
+    # merge newly extracted records into the history behind fullname, returns total rows kept and their job ids,
+    # scraped rows are counted by the caller once per crawl, a batch saves the same jobs under several queries.
+    # export defaults to off with store on, the output file is then written on demand with python seek_store.py export
+    if export is None:
+        export=not store
+    if streaming and not store and output_format=='xlsx':
+        # constant memory path, no dataframe is built for the history
+        return merge_xlsx_history_streaming(outputs,fullname,expiry,metrics)
+
+    # create df from outputs
+    df=create_df(outputs).sort_values(by='time_posted',ascending=False).drop_duplicates(subset='job_id')
+    if metrics is not None:
+        metrics.add_rows('new',len(df))
+
+    if store:
+        # with store on the history lives in a sqlite db next to the output file
+        return merge_store_history(df,Path(fullname).with_suffix('.db'),expiry,export_to=fullname if export else None,output_format=output_format,metrics=metrics)
+
+    df=merge_history(df,fullname,expiry,output_format,metrics)
+    return df.shape[0],df['job_id'].astype(str)
+
+
+def export_metrics(metrics,metrics_json=None,metrics_textfile=None):
+    if metrics_json:
+        metrics.write_json(metrics_json)
+    if metrics_textfile:
+        metrics.write_prometheus(metrics_textfile)
+
+
+def main(BASE_URL,headers,keyword,subclassification,location,pages_to_parse,expiry,SAVE_DIR,max_workers=MAX_WORKERS,engine='threads',incremental=False,store=False,export=None,streaming=False,output_format='xlsx',cache_ttl=None,rate_limit=RATE_LIMIT,index=True,rollups=True,sharded=False,enrich=False,progress=None,cancel=None,on_records=None,metrics_json=None,metrics_textfile=None):
+    # progress(pages_done,pages_total) and cancel (a threading.Event) let a caller on another thread follow or stop the crawl,
+    # rate_limit caps requests/sec for the adaptive rate controller, None turns pacing off,
+    # index adds the new jobs to the full text index in data/jobs_index.db, rollups to the daily counts in data/rollups.db,
+    # sharded splits a query over the api page ceiling into facet slices and crawls all of them, pages_to_parse is then ignored,
+    # enrich fetches the full ad text of jobs not seen before into a description column,
+    # on_records receives this run's extracted records before they are merged into the history,
+    # metrics_json/metrics_textfile are paths for the run summary and a prometheus textfile
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+    if output_format=='parquet' and importlib.util.find_spec('pyarrow') is None:
+        # fail before the crawl rather than at write time after it
+        raise ImportError("The parquet output format needs pyarrow (pip install -r requirements.txt)")
+    
+    # get filename for future IO operations
+    fname=file_name_formatter(keyword,subclassification,location,ext=EXTENSIONS[output_format])
+    fullname = SAVE_DIR / fname
+    # with store on the history lives in a sqlite db next to the workbook
+    history_path = Path(fullname).with_suffix('.db') if store else Path(fullname)
+    metrics=RunMetrics(labels={'query':Path(fname).stem}) if metrics_json or metrics_textfile else None
+
+    # the watermark is only trusted while the history file it describes still exists
+    watermark=load_watermark(str(history_path)) if incremental and history_path.exists() else None
+
+    # reruns within cache_ttl seconds are served from disk
+    cache=ResponseCache(ttl=cache_ttl) if cache_ttl else None
+    cache_report=''
+    # backs off on 429/5xx and slow responses, ramps back up while the site keeps up
+    controller=RateController(rate=rate_limit,max_limit=max_workers) if rate_limit else None
+
+    # page 1 is fetched first, its total count decides how many more pages are scheduled,
+    # the fetch stage is wall time and includes the extract stage of pages parsed as they arrive
+    fetch_error=None
+    outputs=[]
+    with timed_stage(metrics,'fetch'):
+        try:
+            if watermark:
+                outputs=crawl_pages_incremental(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,watermark,cache=cache,progress=progress,cancel=cancel,metrics=metrics,controller=controller)
+            elif sharded:
+                outputs=crawl_sharded(keyword,subclassification,location,BASE_URL,headers,max_workers=max_workers,cache=cache,progress=progress,cancel=cancel,metrics=metrics,controller=controller)
+            elif engine=='async':
+                # single event loop, max_workers pages in flight at once
+                outputs=asyncio.run(crawl_pages_async(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,concurrency=max_workers,cache=cache,progress=progress,cancel=cancel,metrics=metrics,controller=controller))
+            else:
+                # run pages in threads sharing one connection pool sized to the worker count
+                outputs=crawl_pages(keyword,subclassification,location,BASE_URL,headers,pages_to_parse,max_workers=max_workers,cache=cache,progress=progress,cancel=cancel,metrics=metrics,controller=controller)
+        except SearchUnavailable as e:
+            logger.error(e)
+            fetch_error=str(e)
+    if metrics is not None:
+        metrics.add_rows('scraped',len(outputs))
+
+    if cache:
+        cache_report=f' {cache.report()}'
+        logger.info(cache.report())
+    if controller:
+        logger.info(controller.report())
+
+    if is_cancelled(cancel):
+        # a cancelled crawl leaves the history untouched
+        message='Seeking cancelled, nothing was saved.'
+    elif fetch_error:
+        # not the same as an empty search, the history is left untouched
+        message=f'{fetch_error}, nothing was saved. Check the connection and try again.'
+    elif not outputs:
+        message=('No new jobs since last run.' if watermark else 'No jobs found for this search.')+cache_report
+    else:
+        if enrich:
+            with timed_stage(metrics,'enrich'):
+                fetched=enrich_records(outputs,metrics=metrics,controller=controller)
+            logger.info(f'Fetched {fetched} job descriptions, the rest came from the detail cache')
+        else:
+            # descriptions of earlier enriched runs are kept, nothing is fetched
+            enrich_records(outputs,fetch=False)
+
+        if on_records:
+            on_records(outputs)
+
+        # newest listing seen so far, taken before time_posted is made tz naive for excel
+        newest_listing=max((job.time_posted for job in outputs if job.time_posted),default=None)
+        if watermark:
+            newest_listing=max(newest_listing or watermark['newest_listing'],watermark['newest_listing'])
+        
+        total,job_ids=save_results(outputs,fullname,expiry,store,export,streaming,output_format,metrics)
+
+        if incremental and newest_listing:
+            save_watermark(str(history_path),newest_listing,job_ids)
+        if index:
+            # the index keeps every job ever collected, expiry only applies to the history
+            with timed_stage(metrics,'index'),JobIndex(INDEX_PATH) as job_index:
+                job_index.add(outputs)
+        message=f'A total of {total} jobs have been scraped.'+cache_report
 
-        # override existing csv
-        write_df_to_xlsx(df,fullname)
+    if rollups and not is_cancelled(cancel) and not fetch_error:
+        # trends outlive the history, the rollups are never expired, also on empty runs so expiries
+        # are counted on the day they happen like watch mode does
+        with timed_stage(metrics,'rollups'),Rollups(ROLLUP_PATH) as daily_rollups:
+            daily_rollups.update(Path(fname).stem,outputs,expiry)
 
-    except FileNotFoundError:
-        write_df_to_xlsx(df,fullname)
-    return f'A total of {df.shape[0]} jobs have been scraped.'
+    if metrics is not None:
+        export_metrics(metrics,metrics_json,metrics_textfile)
+    return message
 
 
 
@@ -248,6 +1492,21 @@ if __name__ == '__main__':
         'pages_to_parse':10,
         'expiry':21,
         'SAVE_DIR':BASE_DIR,
+        'engine':'threads',
+        'incremental':False,
+        'store':False,
+        # None exports unless store is on
+        'export':None,
+        'streaming':False,
+        'output_format':'xlsx',
+        'cache_ttl':None,
+        'rate_limit':RATE_LIMIT,
+        'index':True,
+        'rollups':True,
+        'sharded':False,
+        'enrich':False,
+        'metrics_json':None,
+        'metrics_textfile':None,
     }
 
     main(**kwargs)
@@ -0,0 +1,178 @@
+import argparse, logging, re, sqlite3
+from datetime import datetime, timedelta
+import pandas as pd
+from seek_config import BASE_DIR, JOB_URL
+from seek_store import JobStore, JOB_COLUMNS, TIME_FORMAT
+
+'''
+    This file contains the full text index over every job Seeker has collected
+
+    Jobs are kept in a SQLite table with an FTS5 index on job_title, company, teaser and bullet_pts, triggers keep
+    the index in step with the table so each run only indexes its new rows. Nothing is ever expired from here.
+    Query syntax:
+
+        python "data engineer" title:senior company:"acme corp" location:brisbane type:contract -php django*
+
+    plain words and "phrases" must all match, field:term limits a match to one field, -term excludes and
+    a trailing * matches a prefix. Search from the command line with:
+
+        python seek_index.py 'python "data engineer" location:brisbane' --limit 20
+'''
+
+
+logger=logging.getLogger(__name__)
+
+INDEX_PATH=BASE_DIR / 'data/jobs_index.db'
+SEARCH_LIMIT=500
+
+# full text fields with their bm25 weights, a hit in the title counts for more than one in the bullet points
+TEXT_FIELDS={'job_title':10.0,'company':5.0,'teaser':2.0,'bullet_pts':1.0}
+# plain column filters, matched as case insensitive substrings
+FILTER_FIELDS=('location','area','classification','contract_type','workArrangements','salary')
+
+FIELD_ALIASES={
+    'title':'job_title','job_title':'job_title','company':'company','teaser':'teaser','bullets':'bullet_pts','bullet_pts':'bullet_pts',
+    'location':'location','area':'area','classification':'classification','type':'contract_type','contract_type':'contract_type',
+    'arrangement':'workArrangements','workarrangements':'workArrangements','salary':'salary',
+}
+
+# [-][field:]"phrase" or [-][field:]word
+TOKEN_RE=re.compile(r'(-?)(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+
+def fts_term(text):
+    # quoted so user input never reaches the fts5 query parser as syntax, a trailing * stays a prefix search
+    prefix=text.endswith('*')
+    text=text.rstrip('*')
+    if not text:
+        return None
+    return '"'+text.replace('"','""')+'"'+('*' if prefix else '')
+
+
+def parse_query(query):
+    # returns (fts5 match expression or None, fts5 expression to exclude or None, [(sql condition, param)])
+    positives,negatives,conditions=[],[],[]
+    for negate,field,phrase,word in TOKEN_RE.findall(query or ''):
+        text=phrase or word
+        column=FIELD_ALIASES.get(field.lower()) if field else None
+        if field and column is None:
+            # not a field we know, e.g. "c#:net", search for it as typed
+            text=f'{field}:{text}'
+        if column in FILTER_FIELDS:
+            like=f"%{text.replace('%','').replace('_','')}%"
+            conditions.append((f"COALESCE(j.{column},'') {'NOT ' if negate else ''}LIKE ?",like))
+            continue
+        term=fts_term(text)
+        if term is None:
+            continue
+        if column:
+            term=f'{column} : {term}'
+        (negatives if negate else positives).append(term)
+    match=' AND '.join(positives) or None
+    exclude=' OR '.join(negatives) or None
+    return match,exclude,conditions
+
+
+class JobIndex(JobStore):
+    def __init__(self,path=INDEX_PATH):
+        super().__init__(path)
+        columns=', '.join(TEXT_FIELDS)
+        new_values=', '.join(f'new.{col}' for col in TEXT_FIELDS)
+        old_values=', '.join(f'old.{col}' for col in TEXT_FIELDS)
+        changed=' OR '.join(f'old.{col} IS NOT new.{col}' for col in TEXT_FIELDS)
+        # external content table, the text lives once in jobs and fts5 only keeps the index
+        self.conn.executescript(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5({columns}, content='jobs', content_rowid='rowid', tokenize='porter unicode61 remove_diacritics 2');
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN
+                INSERT INTO jobs_fts(rowid, {columns}) VALUES (new.rowid, {new_values});
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN
+                INSERT INTO jobs_fts(jobs_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            END;
+            CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE ON jobs WHEN {changed} BEGIN
+                INSERT INTO jobs_fts(jobs_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+                INSERT INTO jobs_fts(rowid, {columns}) VALUES (new.rowid, {new_values});
+            END;
+        ''')
+        self.conn.commit()
+
+    def add(self,records):
+        # extracted records straight from a crawl, no dataframe needed
+        rows=[]
+        for record in records:
+            row={col:getattr(record,col,None) for col in JOB_COLUMNS}
+            row['job_id']=str(record.job_id)
+            row['time_posted']=record.time_posted.strftime(TIME_FORMAT) if record.time_posted else None
+            row['url']=JOB_URL.format(record.job_id)
+            rows.append(tuple(row.values()))
+        return self.upsert_rows(rows)
+
+    def rebuild(self):
+        # only needed if the index was lost or the tokenizer changed, the triggers keep it current otherwise
+        with self.conn:
+            self.conn.execute("INSERT INTO jobs_fts(jobs_fts) VALUES ('rebuild')")
+
+    def optimize(self):
+        # merges index segments, worth running after a large backfill
+        with self.conn:
+            self.conn.execute("INSERT INTO jobs_fts(jobs_fts) VALUES ('optimize')")
+
+    def search(self,query,limit=SEARCH_LIMIT,since=None):
+        # best matches first, newest first when the query only has column filters, since limits to the last n days
+        match,exclude,conditions=parse_query(query)
+        where=[condition for condition,_ in conditions]
+        params=[param for _,param in conditions]
+        if exclude:
+            where.append('j.rowid NOT IN (SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ?)')
+            params.append(exclude)
+        if since:
+            where.append('j.time_posted >= ?')
+            params.append((datetime.now()-timedelta(days=since)).strftime(TIME_FORMAT))
+
+        columns=', '.join(f'j.{col}' for col in JOB_COLUMNS)
+        if match:
+            weights=', '.join(str(weight) for weight in TEXT_FIELDS.values())
+            sql=(f'SELECT {columns}, bm25(jobs_fts, {weights}) AS score FROM jobs_fts JOIN jobs j ON j.rowid=jobs_fts.rowid '
+                 f"WHERE jobs_fts MATCH ? {''.join(f' AND {condition}' for condition in where)} ORDER BY score, j.time_posted DESC LIMIT ?")
+            params=[match,*params,limit]
+        else:
+            sql=f"SELECT {columns}, NULL AS score FROM jobs j {'WHERE '+' AND '.join(where) if where else ''} ORDER BY j.time_posted DESC LIMIT ?"
+            params=[*params,limit]
+
+        try:
+            df=pd.read_sql_query(sql,self.conn,params=params)
+        except (sqlite3.OperationalError,pd.errors.DatabaseError) as e:
+            logger.error(f"Search for {query!r} failed with msg:\n{e}")
+            return pd.DataFrame(columns=JOB_COLUMNS)
+        df['time_posted']=pd.to_datetime(df['time_posted'],format=TIME_FORMAT)
+        # sqlite hands booleans back as 0/1
+        for col in ['isPremium','isStandOut']:
+            df[col]=df[col].map({1:True,0:False})
+        return df.drop(columns='score')
+
+
+def search_jobs(query,limit=SEARCH_LIMIT,since=None,path=INDEX_PATH):
+    with JobIndex(path) as job_index:
+        return job_index.search(query,limit,since)
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Search every job Seeker has collected')
+    parser.add_argument('query',nargs='?',default='',help='words, "phrases", field:term filters and -exclusions')
+    parser.add_argument('--limit',type=int,default=20)
+    parser.add_argument('--since',type=int,metavar='DAYS',help='only jobs posted in the last DAYS days')
+    parser.add_argument('--import',dest='imports',nargs='+',default=[],metavar='FILE',help='backfill from existing xlsx/csv/parquet histories first')
+    args=parser.parse_args()
+
+    with JobIndex() as job_index:
+        if args.imports:
+            from seek_crawler import READERS
+            for path in args.imports:
+                output_format=path.rsplit('.',1)[-1]
+                df=READERS[output_format](path)
+                job_index.upsert(df)
+                print(f'Indexed {len(df)} jobs from {path}')
+            job_index.optimize()
+        results=job_index.search(args.query,args.limit,args.since)
+    for row in results.itertuples(index=False):
+        print(f'{row.time_posted:%Y-%m-%d}  {row.job_title} - {row.company} ({row.location})  {row.url}')
@@ -0,0 +1,144 @@
+import argparse, sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+from seek_config import BASE_DIR
+
+'''
+    This file contains the daily rollups of posting activity for Seeker
+
+    Every run adds its new jobs to per day counts by classification, location, contract type and work arrangement,
+    with how many of them listed a salary, plus how many jobs were new and how many expired each day. A small
+    ledger of job ids keeps reruns from counting a job twice, nothing here is deleted when the history expires.
+    Query or export with:
+
+        python seek_rollups.py --dimension classification --since 30 [--query "python brisbane"] [--export rollups.xlsx]
+'''
+
+
+ROLLUP_PATH=BASE_DIR / 'data/rollups.db'
+DIMENSIONS=('all','classification','location','contract_type','workArrangements')
+DATE_FORMAT=r'%Y-%m-%d'
+
+
+class Rollups:
+    def __init__(self,path=ROLLUP_PATH):
+        self.path=path
+        self.conn=sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS ledger (query TEXT, job_id TEXT, day TEXT, expired_on TEXT, PRIMARY KEY (query, job_id));
+            CREATE INDEX IF NOT EXISTS idx_ledger_open ON ledger (query, expired_on, day);
+            CREATE TABLE IF NOT EXISTS daily (query TEXT, day TEXT, dimension TEXT, value TEXT, jobs INTEGER, with_salary INTEGER, PRIMARY KEY (query, day, dimension, value));
+            CREATE TABLE IF NOT EXISTS activity (query TEXT, day TEXT, new_jobs INTEGER DEFAULT 0, expired_jobs INTEGER DEFAULT 0, PRIMARY KEY (query, day));
+        ''')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def update(self,query,records,expiry,now=None):
+        # adds the jobs this query has not counted before, then expires the ones past expiry, returns (new, expired)
+        now=now or datetime.now()
+        today=now.strftime(DATE_FORMAT)
+        jobs,with_salary=Counter(),Counter()
+        new_jobs=0
+        with self.conn:
+            for record in records:
+                # posting day, jobs without a listing date count on the day they were found
+                day=record.time_posted.strftime(DATE_FORMAT) if record.time_posted else today
+                cursor=self.conn.execute('INSERT INTO ledger (query, job_id, day) VALUES (?, ?, ?) ON CONFLICT (query, job_id) DO NOTHING',(query,str(record.job_id),day))
+                if not cursor.rowcount:
+                    continue
+                new_jobs+=1
+                for dimension in DIMENSIONS:
+                    key=(day,dimension,'' if dimension=='all' else str(getattr(record,dimension) or ''))
+                    jobs[key]+=1
+                    with_salary[key]+=bool(record.salary)
+
+            self.conn.executemany(
+                'INSERT INTO daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (query, day, dimension, value) DO UPDATE SET jobs=jobs+excluded.jobs, with_salary=with_salary+excluded.with_salary',
+                [(query,*key,count,with_salary[key]) for key,count in jobs.items()]
+            )
+            # same cutoff as the history merge, at day granularity
+            cutoff=(now-timedelta(days=expiry)).strftime(DATE_FORMAT)
+            expired=self.conn.execute('UPDATE ledger SET expired_on=? WHERE query=? AND expired_on IS NULL AND day < ?',(today,query,cutoff)).rowcount
+            self.conn.execute(
+                'INSERT INTO activity VALUES (?, ?, ?, ?) ON CONFLICT (query, day) DO UPDATE SET new_jobs=new_jobs+excluded.new_jobs, expired_jobs=expired_jobs+excluded.expired_jobs',
+                (query,today,new_jobs,expired)
+            )
+        return new_jobs,expired
+
+    def queries(self):
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT query FROM activity ORDER BY query')]
+
+    def _where(self,query,since,column='day'):
+        where,params=[],[]
+        if query is not None:
+            where.append('query = ?')
+            params.append(query)
+        if since:
+            where.append(f'{column} >= ?')
+            params.append((datetime.now()-timedelta(days=since)).strftime(DATE_FORMAT))
+        return (' AND '.join(where) or '1'),params
+
+    def counts(self,dimension='classification',query=None,since=None):
+        # jobs posted per day and value of one dimension, summed over every query unless one is given
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension!r}, expected one of {DIMENSIONS}")
+        where,params=self._where(query,since)
+        df=pd.read_sql_query(
+            f'SELECT day, value AS "{dimension}", SUM(jobs) AS jobs, SUM(with_salary) AS with_salary FROM daily '
+            f'WHERE dimension = ? AND {where} GROUP BY day, value ORDER BY day DESC, jobs DESC',
+            self.conn,params=[dimension,*params]
+        )
+        df['salary_ratio']=(df['with_salary']/df['jobs']).round(3)
+        df['day']=pd.to_datetime(df['day'],format=DATE_FORMAT)
+        return df.drop(columns='all') if dimension=='all' else df
+
+    def activity(self,query=None,since=None):
+        # jobs first seen and jobs expired per day
+        where,params=self._where(query,since)
+        df=pd.read_sql_query(
+            f'SELECT day, SUM(new_jobs) AS new_jobs, SUM(expired_jobs) AS expired_jobs FROM activity WHERE {where} GROUP BY day ORDER BY day DESC',
+            self.conn,params=params
+        )
+        df['day']=pd.to_datetime(df['day'],format=DATE_FORMAT)
+        return df
+
+    def export(self,fullname,query=None,since=None):
+        # xlsx gets a sheet per dimension plus activity, csv one long table with a dimension column and a _activity.csv next to it
+        frames={dimension:self.counts(dimension,query,since) for dimension in DIMENSIONS}
+        if Path(fullname).suffix=='.csv':
+            pd.concat([df.rename(columns={dimension:'value'}).assign(dimension=dimension) for dimension,df in frames.items()],ignore_index=True).to_csv(fullname,index=False)
+            self.activity(query,since).to_csv(Path(fullname).with_name(f'{Path(fullname).stem}_activity.csv'),index=False)
+            return
+        with pd.ExcelWriter(fullname,engine='openpyxl') as writer:
+            self.activity(query,since).to_excel(writer,sheet_name='activity',index=False)
+            for dimension,df in frames.items():
+                df.to_excel(writer,sheet_name=dimension,index=False)
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Daily posting activity collected by Seeker')
+    parser.add_argument('--dimension',choices=DIMENSIONS,default='all')
+    parser.add_argument('--query',help='one query (its output file name without extension), all queries by default')
+    parser.add_argument('--since',type=int,metavar='DAYS',help='only the last DAYS days')
+    parser.add_argument('--export',type=Path,metavar='FILE',help='write every dimension to an .xlsx or .csv file instead of printing')
+    args=parser.parse_args()
+
+    with Rollups() as rollups:
+        if args.export:
+            rollups.export(args.export,args.query,args.since)
+            print(f'Rollups exported to {args.export}')
+        else:
+            print(rollups.activity(args.query,args.since).to_string(index=False))
+            print()
+            print(rollups.counts(args.dimension,args.query,args.since).to_string(index=False))
@@ -0,0 +1,128 @@
+import argparse, sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+import pandas as pd
+
+'''
+    This file contains the SQLite job store for Seeker
+
+    Jobs are keyed on job_id and indexed on time_posted so every run only touches the new rows,
+    the excel workbook is exported from here on demand:
+
+        python seek_store.py export data/python_brisbane.db data/python_brisbane.xlsx [--format xlsx]
+'''
+
+
+JOB_COLUMNS = ['job_title', 'job_id', 'isPremium', 'isStandOut', 'company_id', 'company', 'area', 'areaId',
+               'classification_id', 'classification', 'locationId', 'location', 'time_posted', 'salary',
+               'contract_type', 'teaser', 'bullet_pts', 'workArrangements', 'description', 'url']
+
+# time_posted is kept as tz naive AEST text in this format so text order is time order
+TIME_FORMAT = r'%Y-%m-%d %H:%M:%S'
+
+# in memory schema of the history, repetitive strings are categoricals, ids nullable ints and flags nullable booleans
+CATEGORY_COLUMNS = ['company', 'area', 'classification', 'location', 'contract_type', 'workArrangements']
+INT_COLUMNS = ['company_id', 'areaId', 'classification_id', 'locationId']
+BOOL_COLUMNS = ['isPremium', 'isStandOut']
+
+
+def apply_job_schema(df):
+    # in place for whichever of the columns df has, a tz aware time_posted keeps its timezone
+    for col in CATEGORY_COLUMNS:
+        if col in df:
+            df[col]=df[col].astype('category')
+    for col in INT_COLUMNS:
+        if col in df:
+            df[col]=pd.to_numeric(df[col],errors='coerce').astype('Int64')
+    for col in BOOL_COLUMNS:
+        if col in df:
+            df[col]=df[col].astype('boolean')
+    if 'job_id' in df:
+        df['job_id']=df['job_id'].astype(str)
+    if 'time_posted' in df and not pd.api.types.is_datetime64_any_dtype(df['time_posted']):
+        df['time_posted']=pd.to_datetime(df['time_posted'])
+    return df
+
+
+class JobStore:
+    def __init__(self,path):
+        self.path=path
+        self.conn=sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        columns=', '.join(f'{col} TEXT PRIMARY KEY' if col=='job_id' else col for col in JOB_COLUMNS)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS jobs ({columns})')
+        # stores created before a column was added get it appended
+        existing={row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        for col in JOB_COLUMNS:
+            if col not in existing:
+                self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {col}')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_time_posted ON jobs (time_posted)')
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def upsert(self,df):
+        # new rows win over stored ones, same as keep='first' when merging with the workbook
+        df=df.reindex(columns=JOB_COLUMNS)
+        df['job_id']=df['job_id'].astype(str)
+        df['time_posted']=pd.to_datetime(df['time_posted']).dt.strftime(TIME_FORMAT)
+        return self.upsert_rows(df.astype(object).where(df.notna(),None).itertuples(index=False,name=None))
+
+    def upsert_rows(self,rows):
+        # rows are tuples in JOB_COLUMNS order with time_posted already formatted
+        columns=', '.join(JOB_COLUMNS)
+        placeholders=', '.join('?'*len(JOB_COLUMNS))
+        # a row without a description keeps the stored one, enrichment is opt-in per run
+        updates=', '.join(f'{col}=COALESCE(excluded.{col},jobs.{col})' if col=='description' else f'{col}=excluded.{col}' for col in JOB_COLUMNS if col!='job_id')
+        with self.conn:
+            cursor=self.conn.executemany(f'INSERT INTO jobs ({columns}) VALUES ({placeholders}) ON CONFLICT(job_id) DO UPDATE SET {updates}',rows)
+        return cursor.rowcount
+
+    def expire(self,expiry):
+        # range delete on the time_posted index
+        cutoff=(datetime.now()-timedelta(days=expiry)).strftime(TIME_FORMAT)
+        with self.conn:
+            cursor=self.conn.execute('DELETE FROM jobs WHERE time_posted < ?',(cutoff,))
+        return cursor.rowcount
+
+    def job_ids(self):
+        return {row[0] for row in self.conn.execute('SELECT job_id FROM jobs')}
+
+    def to_df(self):
+        df=pd.read_sql_query(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs ORDER BY time_posted DESC",self.conn)
+        df['time_posted']=pd.to_datetime(df['time_posted'],format=TIME_FORMAT)
+        # sqlite hands booleans back as 0/1
+        for col in BOOL_COLUMNS:
+            df[col]=df[col].map({1:True,0:False})
+        return apply_job_schema(df)
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser(description='Seeker job store')
+    commands=parser.add_subparsers(dest='command',required=True)
+    export=commands.add_parser('export',help='write the jobs of a store to an output file')
+    export.add_argument('db',help='store written by a run with store on, the .db next to its output')
+    export.add_argument('output',help='output file, the format follows its extension unless --format is given')
+    export.add_argument('--format',dest='output_format',choices=['xlsx','csv','parquet'])
+    args=parser.parse_args()
+
+    if not Path(args.db).exists():
+        parser.error(f'no store at {args.db}')
+    from seek_crawler import WRITERS
+    output_format=args.output_format or args.output.rsplit('.',1)[-1]
+    if output_format not in WRITERS:
+        parser.error(f'unknown output format {output_format!r}, use --format')
+    with JobStore(args.db) as job_store:
+        df=job_store.to_df()
+    WRITERS[output_format](df,args.output)
+    print(f'Exported {len(df)} jobs to {args.output}')
@@ -0,0 +1,247 @@
+import requests, argparse, heapq, json, logging, signal, subprocess, sys, threading, time
+from pathlib import Path
+from datetime import datetime, timedelta
+from seek_crawler import (API_URL, BASE_DIR, JOB_URL, MAX_WORKERS, RATE_LIMIT, REQUEST_TIMEOUT, OUTPUT_FORMATS, EXTENSIONS, READERS, AEST, AEST_MIN,
+                          headers, RateController, SearchUnavailable, JobStore, JobIndex, INDEX_PATH, Rollups, ROLLUP_PATH, create_session, crawl_pages_incremental, enrich_records,
+                          file_name_formatter, save_results)
+from seek_batch import load_specs
+
+'''
+    This file contains the watch mode for Seeker
+
+    One long running process polls every query of a spec file on its own interval, the connection pool, the rate
+    controller and each query's known job ids stay in memory between polls so a poll only walks pages until
+    it reaches jobs it has already seen. Newly seen jobs go straight to the sinks, the history files are
+    only rewritten every flush interval or once enough new jobs are pending. Usage:
+
+        python seek_watch.py queries.json --interval 900 [--jsonl data/new_jobs.jsonl] [--notify] [--webhook http://127.0.0.1:8000/jobs]
+
+    Query specs are the same as seek_batch.py, a spec may set its own "interval" in seconds
+'''
+
+
+# logger set up, a daemon wants to see every poll
+logger=logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+handler=logging.StreamHandler()
+handler.setFormatter(logging.Formatter(fmt='[%(asctime)s %(name)s]-%(levelname)s>> %(message)s',datefmt=r'%Y-%m-%d %H:%M:%S'))
+logger.addHandler(handler)
+
+POLL_INTERVAL=900
+FLUSH_INTERVAL=3600
+FLUSH_SIZE=500
+WATCH_LOG=BASE_DIR / 'data/new_jobs.jsonl'
+
+
+# =================== Sinks =====================
+def record_payload(query_name,record):
+    payload=record.as_dict()
+    payload['time_posted']=record.time_posted.isoformat() if record.time_posted else None
+    payload['url']=JOB_URL.format(record.job_id)
+    payload['query']=query_name
+    return payload
+
+
+class JsonlSink:
+    # one json line per new job, appended as soon as it is seen
+    def __init__(self,path=WATCH_LOG):
+        Path(path).parent.mkdir(parents=True,exist_ok=True)
+        self.wf=open(path,'a',encoding='utf-8')
+
+    def emit(self,query_name,records):
+        for record in records:
+            self.wf.write(json.dumps(record_payload(query_name,record),default=str)+'\n')
+        self.wf.flush()
+
+    def close(self):
+        self.wf.close()
+
+
+class NotifySink:
+    # one desktop notification per poll that found something
+    def emit(self,query_name,records):
+        title=f'{len(records)} new jobs for {query_name}'
+        body='\n'.join(f'{record.job_title} - {record.company}' for record in records[:5])
+        try:
+            match sys.platform:
+                case 'linux':
+                    subprocess.run(['notify-send','--app-name=Seeker',title,body],check=False,timeout=5)
+                case 'darwin':
+                    script=f'display notification {json.dumps(body)} with title "Seeker" subtitle {json.dumps(title)}'
+                    subprocess.run(['osascript','-e',script],check=False,timeout=5)
+                case _:
+                    logger.info(f'{title}\n{body}')
+        except (OSError,subprocess.TimeoutExpired) as e:
+            logger.warning(f'Desktop notification failed with msg: {e}')
+
+    def close(self):
+        pass
+
+
+class WebhookSink:
+    # posts {"query": ..., "jobs": [...]} to a local endpoint, a failed post is logged and the jobs stay in the history
+    def __init__(self,url):
+        self.url=url
+        self.session=requests.Session()
+
+    def emit(self,query_name,records):
+        payload={'query':query_name,'jobs':[record_payload(query_name,record) for record in records]}
+        try:
+            self.session.post(self.url,data=json.dumps(payload,default=str),headers={'content-type':'application/json'},timeout=REQUEST_TIMEOUT).raise_for_status()
+        except requests.RequestException as e:
+            logger.error(f'Webhook {self.url} failed with msg: {e}')
+
+    def close(self):
+        self.session.close()
+
+
+# =================== Watched Queries =====================
+def load_known_ids(fullname,output_format='xlsx',store=False):
+    # the only time the history is read, afterwards the set lives in memory
+    if store:
+        db_path=Path(fullname).with_suffix('.db')
+        if not db_path.exists():
+            return set()
+        with JobStore(db_path) as job_store:
+            return job_store.job_ids()
+    if not Path(fullname).exists():
+        return set()
+    return set(READERS[output_format](fullname)['job_id'].astype(str))
+
+
+class WatchedQuery:
+    def __init__(self,spec,interval=POLL_INTERVAL,output_format='xlsx',store=False):
+        self.spec=spec
+        self.interval=spec.get('interval',interval)
+        self.name=file_name_formatter(spec['kw'],spec['classification'],spec['location'],ext='')
+        self.fullname=spec['save_path'] / f'{self.name}{EXTENSIONS[output_format]}'
+        self.known=load_known_ids(self.fullname,output_format,store)
+        self.newest_listing=AEST_MIN
+        # new records not yet written to the history
+        self.pending=[]
+
+    def poll(self,BASE_URL,headers,session,controller=None):
+        # walks pages newest first until one holds nothing unknown, returns the records never seen before
+        watermark={'newest_listing':self.newest_listing,'job_ids':self.known}
+        outputs=crawl_pages_incremental(self.spec['kw'],self.spec['classification'],self.spec['location'],BASE_URL,headers,self.spec['pageNum'],watermark,session=session,controller=controller)
+        # jobs past expiry are dropped from the history on flush, they must not come back as new
+        cutoff=datetime.now(AEST)-timedelta(days=self.spec['expiry'])
+        new_records=[]
+        for record in outputs:
+            job_id=str(record.job_id)
+            if job_id in self.known or (record.time_posted and record.time_posted < cutoff):
+                continue
+            self.known.add(job_id)
+            new_records.append(record)
+        self.newest_listing=max([self.newest_listing]+[record.time_posted for record in new_records if record.time_posted])
+        # a job an enriched run already described keeps its description in the history and the index
+        enrich_records(new_records,fetch=False)
+        self.pending.extend(new_records)
+        return new_records
+
+    def flush(self,store=False,export=None,output_format='xlsx'):
+        if not self.pending:
+            return
+        try:
+            total,job_ids=save_results(self.pending,self.fullname,self.spec['expiry'],store,export,False,output_format)
+        except OSError as e:
+            # e.g. the workbook is open in excel, keep the records for the next flush
+            logger.error(f'{self.name}: flushing {len(self.pending)} jobs failed with msg: {e}')
+            return
+        logger.info(f'{self.name}: flushed {len(self.pending)} new jobs, {total} in the history')
+        # expired jobs leave the known set together with the history
+        self.known=set(map(str,job_ids))
+        self.pending=[]
+
+
+# =================== Watch Loop =====================
+def watch(specs,sinks,BASE_URL=API_URL,headers=headers,interval=POLL_INTERVAL,max_workers=MAX_WORKERS,store=False,export=None,output_format='xlsx',
+          rate_limit=RATE_LIMIT,index=True,rollups=True,flush_interval=FLUSH_INTERVAL,flush_size=FLUSH_SIZE,stop=None):
+    # runs until stop (a threading.Event) is set, pending jobs are flushed on the way out
+    stop=stop or threading.Event()
+    queries=[WatchedQuery(spec,interval,output_format,store) for spec in specs]
+    session=create_session(pool_size=max_workers,headers=headers)
+    controller=RateController(rate=rate_limit,max_limit=max_workers) if rate_limit else None
+    job_index=JobIndex(INDEX_PATH) if index else None
+    daily_rollups=Rollups(ROLLUP_PATH) if rollups else None
+
+    def flush_all():
+        for query in queries:
+            query.flush(store,export,output_format)
+
+    # (next poll due, query) on the monotonic clock, every query is polled once at start up
+    schedule=[(time.monotonic(),i) for i in range(len(queries))]
+    heapq.heapify(schedule)
+    last_flush=time.monotonic()
+    try:
+        while not stop.wait(max(0,schedule[0][0]-time.monotonic())):
+            _,i=schedule[0]
+            query=queries[i]
+            heapq.heapreplace(schedule,(time.monotonic()+query.interval,i))
+
+            try:
+                new_records=query.poll(BASE_URL,headers,session,controller)
+            except SearchUnavailable as e:
+                # the site or the network is down, try again on the next interval
+                logger.error(f'{query.name}: {e}')
+                continue
+            if daily_rollups is not None:
+                # also on empty polls so expiries are counted on the day they happen
+                daily_rollups.update(query.name,new_records,query.spec['expiry'])
+            if new_records:
+                logger.info(f'{query.name}: {len(new_records)} new jobs')
+                for sink in sinks:
+                    sink.emit(query.name,new_records)
+                if job_index is not None:
+                    job_index.add(new_records)
+
+            if sum(len(query.pending) for query in queries) >= flush_size or time.monotonic()-last_flush >= flush_interval:
+                flush_all()
+                last_flush=time.monotonic()
+    finally:
+        flush_all()
+        session.close()
+        if job_index is not None:
+            job_index.close()
+        if daily_rollups is not None:
+            daily_rollups.close()
+        for sink in sinks:
+            sink.close()
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='Poll seek queries on a schedule and emit only new jobs')
+    parser.add_argument('specs',type=Path,help='query spec file, data/args.json style, a spec may set its own "interval"')
+    parser.add_argument('--interval',type=int,default=POLL_INTERVAL,metavar='SECONDS',help='default poll interval per query')
+    parser.add_argument('--jsonl',type=Path,metavar='PATH',help=f'append new jobs here, the default sink is {WATCH_LOG.relative_to(BASE_DIR)}')
+    parser.add_argument('--notify',action='store_true',help='show a desktop notification for new jobs')
+    parser.add_argument('--webhook',metavar='URL',help='post new jobs to this local endpoint')
+    parser.add_argument('--flush-interval',type=int,default=FLUSH_INTERVAL,metavar='SECONDS',help='rewrite the history files at most this often')
+    parser.add_argument('--flush-size',type=int,default=FLUSH_SIZE,metavar='JOBS',help='or as soon as this many new jobs are pending')
+    parser.add_argument('--workers',type=int,default=MAX_WORKERS,help='pooled connections')
+    parser.add_argument('--format',dest='output_format',choices=OUTPUT_FORMATS,default='xlsx')
+    parser.add_argument('--store',action='store_true',help='keep the history in a sqlite store next to each output')
+    parser.add_argument('--export',action=argparse.BooleanOptionalAction,help='rewrite the output files on flush, on by default unless --store is given')
+    parser.add_argument('--no-rollups',dest='rollups',action='store_false',help='skip updating the daily rollups')
+    parser.add_argument('--no-index',dest='index',action='store_false',help='skip adding the jobs to the full text index')
+    parser.add_argument('--rate-limit',type=float,default=RATE_LIMIT,metavar='RPS',help='most requests per second the adaptive controller ramps up to, 0 turns pacing off')
+    args=parser.parse_args(argv)
+
+    sinks=[]
+    if args.jsonl or not (args.notify or args.webhook):
+        sinks.append(JsonlSink(args.jsonl or WATCH_LOG))
+    if args.notify:
+        sinks.append(NotifySink())
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+
+    # ctrl+c or a service stop ends the current poll and flushes before exiting
+    stop=threading.Event()
+    for signum in (signal.SIGINT,signal.SIGTERM):
+        signal.signal(signum,lambda *_: stop.set())
+    watch(load_specs(args.specs),sinks,interval=args.interval,max_workers=args.workers,store=args.store,export=args.export,output_format=args.output_format,
+          rate_limit=args.rate_limit,index=args.index,rollups=args.rollups,flush_interval=args.flush_interval,flush_size=args.flush_size,stop=stop)
+
+
+if __name__ == '__main__':
+    main()
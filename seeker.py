@@ -1,19 +1,119 @@
 from PySide6.QtGui import QAction,QIcon
 from PySide6.QtWidgets import (QWidget,QApplication,QMainWindow,QVBoxLayout,QHBoxLayout,QSpinBox,
-                               QPushButton,QToolButton,QLabel,QScrollArea,QComboBox,
-                               QLineEdit,QFormLayout,QMessageBox,QFileDialog)
-from PySide6.QtCore import QSize,Qt
-import sys, subprocess, json
-from seek_crawler import Path, BASE_DIR, main, headers, API_URL, classifications
+                               QPushButton,QToolButton,QLabel,QComboBox,QPlainTextEdit,QProgressBar,
+                               QTableView,QSplitter,QLineEdit,QFormLayout,QMessageBox,QFileDialog)
+from PySide6.QtCore import QSize,Qt,QObject,QThread,QTimer,Signal,QAbstractTableModel,QModelIndex
+import sys, subprocess, json, logging, threading, time
+from pathlib import Path
+# seek_config is light, seek_crawler (pandas, requests...) is only imported once a crawl starts
+from seek_config import BASE_DIR, headers, API_URL, classifications, ENGINES, classifications_stale, refresh_classifications
+
+logger=logging.getLogger(__name__)
 
 subcategories = [*classifications.keys()]
 
+
+class DataFrameModel(QAbstractTableModel):
+    # table model reading cells straight from a DataFrame, rows are handed to the view in batches as it scrolls
+    batch_size=500
+
+    def __init__(self,df=None,parent=None):
+        super().__init__(parent)
+        self.set_df(df)
+
+    def set_df(self,df):
+        self.beginResetModel()
+        self._df=df
+        self._loaded=0 if df is None else min(len(df),self.batch_size)
+        self.endResetModel()
+
+    def rowCount(self,parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self,parent=QModelIndex()):
+        return 0 if parent.isValid() or self._df is None else self._df.shape[1]
+
+    def canFetchMore(self,parent=QModelIndex()):
+        return not parent.isValid() and self._df is not None and self._loaded < len(self._df)
+
+    def fetchMore(self,parent=QModelIndex()):
+        count=min(self.batch_size,len(self._df)-self._loaded)
+        self.beginInsertRows(QModelIndex(),self._loaded,self._loaded+count-1)
+        self._loaded+=count
+        self.endInsertRows()
+
+    def data(self,index,role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role!=Qt.ItemDataRole.DisplayRole:
+            return None
+        # pandas is already loaded once there is a DataFrame to show, seek_config stays the only import at start up
+        import pandas as pd
+        value=self._df.iat[index.row(),index.column()]
+        # None, NaN, NaT and pd.NA of the Int64/boolean columns show as blank cells
+        if pd.isna(value):
+            return ''
+        return str(value)
+
+    def headerData(self,section,orientation,role=Qt.ItemDataRole.DisplayRole):
+        if role!=Qt.ItemDataRole.DisplayRole or self._df is None:
+            return None
+        if orientation==Qt.Orientation.Horizontal:
+            return str(self._df.columns[section])
+        return str(section+1)
+
+
+class SeekerWorker(QObject):
+    # runs seek_crawler.main() off the Qt event loop, everything is reported back through signals
+    progress=Signal(int,int)
+    records=Signal(object)
+    # return message and whether anything was saved
+    finished=Signal(str,bool)
+    failed=Signal(str)
+
+    def __init__(self,kwargs):
+        super().__init__()
+        self.kwargs=kwargs
+        self.cancel_event=threading.Event()
+        self.saved=False
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def emit_records(self,outputs):
+        # main() hands records over right before saving them, a save that fails ends in failed instead
+        self.saved=True
+        from seek_crawler import create_df
+        self.records.emit(create_df(outputs).sort_values(by='time_posted',ascending=False).drop_duplicates(subset='job_id',ignore_index=True))
+
+    def run(self):
+        try:
+            from seek_crawler import main
+            return_str=main(**self.kwargs,progress=self.progress.emit,cancel=self.cancel_event,on_records=self.emit_records)
+        except Exception as e:
+            self.failed.emit(f'Seeking failed with msg: {e}')
+        else:
+            self.finished.emit(return_str,self.saved)
+
+class ClassificationRefresher(QObject):
+    # refreshes the cached classification table off the event loop
+    refreshed=Signal(object)
+
+    def start(self):
+        threading.Thread(target=self.run,daemon=True).start()
+
+    def run(self):
+        try:
+            self.refreshed.emit(dict(refresh_classifications()))
+        except Exception as e:
+            # keep the cached table, it is refreshed again next time the window opens
+            logger.warning(f'Classification refresh failed with msg: {e}')
+
+
 class MyMainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
         # meta set up
-        self.setWindowTitle('Seeker v5.0')
+        self.setWindowTitle('Seeker v6.0')
 
         # set window icon
         icon_path=BASE_DIR/"data/icon.png"
@@ -72,6 +172,13 @@ class MyMainWindow(QMainWindow):
 
         body_layout.addRow(page_widget,expiry_widget)
 
+        # define crawl engine
+        engine_label=QLabel('Engine: ')
+        self.engine=QComboBox()
+        self.engine.addItems(ENGINES)
+        self.engine.setToolTip('threads: one thread per page, async: single asyncio event loop')
+        body_layout.addRow(engine_label,self.engine)
+
         # define save path
         with open(BASE_DIR / "data/args.json",'r') as rf:
             self.SAVE_DIR=json.load(rf)['save_path'] or BASE_DIR
@@ -102,16 +209,55 @@ class MyMainWindow(QMainWindow):
         self.execute_btn=QPushButton('Go seeking!')
         self.execute_btn.clicked.connect(self.execute_seeker)
 
-        btn_layout.addWidget(self.execute_btn)
+        self.cancel_btn=QPushButton('Cancel')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_seeker)
 
-        # display section
-        self.scroll=QScrollArea()
-        self.display=QLabel('Waiting...')
-        self.display.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.display.setTextInteractionFlags(Qt.TextSelectableByMouse)
-        self.scroll.setWidget(self.display)
-        self.scroll.setWidgetResizable(True)
-        display_layout.addWidget(self.scroll)
+        self.progress_bar=QProgressBar()
+        self.progress_bar.setFormat('%v/%m pages')
+        self.progress_bar.setValue(0)
+
+        btn_layout.addWidget(self.execute_btn)
+        btn_layout.addWidget(self.cancel_btn)
+        btn_layout.addWidget(self.progress_bar)
+
+        # display section, search box and results table on top and an append only log below
+        self.results_model=DataFrameModel()
+        self.results=QTableView()
+        self.results.setModel(self.results_model)
+        self.results.setSortingEnabled(False)
+        # this run's results, shown again when the search box is cleared
+        self.last_results=None
+
+        # search over every job collected so far, runs once typing pauses
+        self.search=QLineEdit()
+        self.search.setPlaceholderText('Search collected jobs, e.g. python "data engineer" company:acme location:brisbane -php')
+        self.search.setClearButtonEnabled(True)
+        self.search_timer=QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search_jobs)
+        self.search.textChanged.connect(lambda _: self.search_timer.start())
+
+        results_layout=QVBoxLayout()
+        results_layout.setContentsMargins(0,0,0,0)
+        results_layout.addWidget(self.search)
+        results_layout.addWidget(self.results)
+        results_widget=QWidget()
+        results_widget.setLayout(results_layout)
+
+        self.display=QPlainTextEdit('Waiting...')
+        self.display.setReadOnly(True)
+        self.display.setMaximumBlockCount(5000)
+
+        splitter=QSplitter(Qt.Orientation.Vertical)
+        splitter.addWidget(results_widget)
+        splitter.addWidget(self.display)
+        display_layout.addWidget(splitter)
+
+        # background crawl, set while a run is in flight
+        self.seeker_thread=None
+        self.worker=None
 
         # define widgets
         # menu bar
@@ -139,6 +285,12 @@ class MyMainWindow(QMainWindow):
         # auto fill last time args
         self.auto_fill()
 
+        # refresh a stale classification table in the background
+        self.classification_refresher=ClassificationRefresher(self)
+        self.classification_refresher.refreshed.connect(self.update_classifications)
+        if classifications_stale():
+            self.classification_refresher.start()
+
     def show_about_info(self):
         self.display.clear()
         about_info = '''
@@ -170,6 +322,11 @@ class MyMainWindow(QMainWindow):
             ## Update log - v5.0
             @ 2024-07-31 Brissy AU
             New seek.com.au api endpoint found so replaced previous html scraping which improves efficiency a lot
+
+            ## Update log - v6.0
+            @ 2026-10-18
+            Seeking runs in the background with live page progress and can be cancelled, scraped jobs are listed in a table
+            Every collected job can be searched from the box above the table, by words, "phrases" and field:term filters
         '''
         self.update_display_text(about_info)
 
@@ -203,15 +360,12 @@ class MyMainWindow(QMainWindow):
 
     def update_display_text(self,new_text:str,clean=False):
         if clean:
-            self.display.setText(new_text)
+            self.display.setPlainText(new_text)
         else:
-            self.display.setText(self.display.text() + '\n' + new_text)
-            self.scroll.verticalScrollBar().setValue(self.scroll.verticalScrollBar().maximum())
-        self.display.repaint()
+            self.display.appendPlainText(new_text)
 
     def update_status_bar(self,msg='Ready'):
         self.statusbar.showMessage(msg)
-        self.statusbar.repaint()
 
     def execute_seeker(self,s):
         # get parameters
@@ -226,23 +380,113 @@ class MyMainWindow(QMainWindow):
         'pages_to_parse':self.pageNum.value(),
         'expiry':self.expiry.value(),
         'SAVE_DIR':self.SAVE_DIR,
+        'engine':self.engine.currentText(),
     }
-        # execute seeker
-        return_str=main(**kwargs)
-
-        # open destination
-        self.show_yes_no_dialog(return_str)
+        # execute seeker in a worker thread so the window stays responsive
+        self.seeker_thread=QThread(self)
+        self.worker=SeekerWorker(kwargs)
+        self.worker.moveToThread(self.seeker_thread)
+        self.seeker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.records.connect(self.show_records)
+        self.worker.finished.connect(self.on_seeker_finished)
+        self.worker.failed.connect(self.on_seeker_failed)
+        for signal in (self.worker.finished,self.worker.failed):
+            signal.connect(self.seeker_thread.quit)
+        self.seeker_thread.finished.connect(self.worker.deleteLater)
+        self.seeker_thread.finished.connect(self.seeker_thread.deleteLater)
+
+        self.set_running(True)
+        self.progress_bar.setRange(0,0)
+        self.update_display_text(f"Seeking {kwargs['keyword'] or 'any'} jobs in {kwargs['location'] or 'any location'}...")
+        self.update_status_bar('Seeking...')
+        self.seeker_thread.start()
+
+    def update_classifications(self,table):
+        global subcategories
+        subcategories=[*table.keys()]
+        current=self.classification.currentText()
+        self.classification.clear()
+        self.classification.addItems(subcategories)
+        self.classification.setCurrentIndex(max(self.classification.findText(current),0))
+
+    def show_records(self,df):
+        self.last_results=df
+        if not self.search.text().strip():
+            self.results_model.set_df(df)
+
+    def search_jobs(self):
+        query=self.search.text().strip()
+        if not query:
+            self.results_model.set_df(self.last_results)
+            self.update_status_bar()
+            return
+        from seek_index import INDEX_PATH, search_jobs
+        if not INDEX_PATH.exists():
+            self.update_status_bar('Nothing collected yet, go seeking first')
+            return
+        start=time.perf_counter()
+        df=search_jobs(query)
+        self.results_model.set_df(df)
+        self.update_status_bar(f'{len(df)} matching jobs in {(time.perf_counter()-start)*1000:.0f} ms')
+
+    def cancel_seeker(self,s):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.update_display_text('Cancelling, waiting for pages in flight...')
+
+    def set_running(self,running):
+        self.execute_btn.setEnabled(not running)
+        self.cancel_btn.setEnabled(running)
+
+    def update_progress(self,pages_done,pages_total):
+        self.progress_bar.setRange(0,pages_total)
+        self.progress_bar.setValue(pages_done)
+        self.update_display_text(f'Page {pages_done}/{pages_total} retrieved')
+
+    def reset_progress(self):
+        # leaves busy mode too, a crawl that never reported progress would keep it spinning
+        self.progress_bar.setRange(0,1)
+        self.progress_bar.reset()
+
+    def on_seeker_finished(self,return_str,saved):
+        self.set_running(False)
+        self.worker=None
+        if saved:
+            # open destination
+            self.show_yes_no_dialog(return_str)
+        else:
+            # cancelled, nothing found or nothing could be fetched, there is no file to open
+            self.reset_progress()
+            self.update_display_text(return_str)
+            self.update_status_bar('Nothing saved. Ready for next seeking...')
 
         # save kwargs used this time
         self.save_args()
 
+    def on_seeker_failed(self,msg):
+        self.set_running(False)
+        self.worker=None
+        self.reset_progress()
+        self.update_display_text(msg)
+        self.update_status_bar('Failed. Ready for next seeking...')
+
+    def closeEvent(self,event):
+        # let a running crawl stop before the window and its thread go away
+        if self.worker is not None:
+            self.worker.cancel()
+            self.seeker_thread.quit()
+            self.seeker_thread.wait()
+        super().closeEvent(event)
+
     def show_yes_no_dialog(self,text):
         reply = QMessageBox.question(self, "Done scraping", "Do you want to open file saved location?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
 
         if reply == QMessageBox.StandardButton.Yes:
             self.open_folder(None)
         
-        self.update_display_text(text,True)
+        self.update_display_text(text)
         self.update_status_bar('Finished. Ready for next seeking...')
 
     def auto_fill(self):
@@ -257,7 +501,7 @@ class MyMainWindow(QMainWindow):
                     target.setText(v)
                 except:
                     if target.__class__.__name__ == 'QComboBox':
-                        target.setCurrentIndex(subcategories.index(v))
+                        target.setCurrentIndex(max(target.findText(v),0))
                     else:
                         target.setValue(v)
     
@@ -283,6 +527,10 @@ class MyMainWindow(QMainWindow):
             self.kwargs['expiry']=self.expiry.value()
             changed_flag=True
 
+        if self.kwargs.get('engine')!=self.engine.currentText():
+            self.kwargs['engine']=self.engine.currentText()
+            changed_flag=True
+
         if self.kwargs['save_path']!=self.save_path.text():
             self.kwargs['save_path']=str(Path(self.save_path.text()))
             changed_flag=True
@@ -291,7 +539,7 @@ class MyMainWindow(QMainWindow):
             with open(BASE_DIR / "data/args.json",'w') as wf:
                 json.dump(self.kwargs,wf,indent=4)
 
-            show_msg=f"New query parameters: {self.kwargs['kw']}, subcategory: {self.kwargs['classification']}, loaction: {self.kwargs['location']}, page(s) to parse: {self.kwargs['pageNum']}, expiry days: {self.kwargs['expiry']} have been saved."
+            show_msg=f"New query parameters: {self.kwargs['kw']}, subcategory: {self.kwargs['classification']}, loaction: {self.kwargs['location']}, page(s) to parse: {self.kwargs['pageNum']}, expiry days: {self.kwargs['expiry']}, engine: {self.kwargs['engine']} have been saved."
             self.update_display_text(show_msg)
     
 if __name__ == '__main__':